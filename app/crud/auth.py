@@ -1,18 +1,24 @@
 """
 CRUD-методы для авторизации и регистрации пользователей
 """
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 import os
+import threading
+import time
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from dotenv import load_dotenv
 
+from app.crud import passwords
 from app.models import models
 from app.schemas import schemas
-from app.db.database import get_db
+from app.db.database import get_async_db
 
 
 load_dotenv()
@@ -20,6 +26,8 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
@@ -43,7 +51,74 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """
+    Пользователь, от имени которого выполняется запрос.
+
+    Атрибуты:
+        id (int): Идентификатор пользователя.
+        username (str): Имя пользователя.
+    """
+    id: int
+    username: str
+
+
+class TokenCache:
+    """
+    Ограниченный LRU-кэш проверенных токенов: токен -> пользователь.
+    Запись живёт не дольше ttl секунд и не дольше срока действия токена.
+    """
+
+    def __init__(self, maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: AuthenticatedUser, token_expires: float):
+        with self._lock:
+            self._entries[token] = (user, min(time.time() + self.ttl, token_expires))
+            self._entries.move_to_end(token)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self, username: str):
+        """Удаляет токены пользователя (после изменения или удаления пользователя)."""
+        with self._lock:
+            for token in [t for t, (user, _) in self._entries.items() if user.username == username]:
+                del self._entries[token]
+
+
+token_cache = TokenCache()
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme),
+                           db: AsyncSession = Depends(get_async_db)):
+    """
+    Пользователь по JWT-токену. Проверенные токены кэшируются (token_cache),
+    поэтому повторные запросы с тем же токеном не декодируют его заново
+    и не обращаются к таблице users.
+    """
+    user = token_cache.get(token)
+    if user is not None:
+        return user
     credentials_exception = HTTPException(
         status_code=401,
         detail="Не удалось проверить учетные данные",
@@ -56,23 +131,27 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if user is None:
+    db_user = (await db.execute(select(models.User.id, models.User.username).where(
+        models.User.username == username))).first()
+    if db_user is None:
         raise credentials_exception
+    user = AuthenticatedUser(id=db_user.id, username=db_user.username)
+    token_cache.put(token, user, payload.get("exp", time.time()))
     return user
 
 
 
 
 @router.post("/register", response_model=schemas.UserResponse, tags=["Авторизация и безопасность"])
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Проверка на существование пользователя
-    existing_user = db.query(models.User).filter(models.User.username == user.username).first()
+    existing_user = (await db.scalars(select(models.User).where(
+        models.User.username == user.username))).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Пользователь с таким именем уже существует")
 
-    # Хэшируем пароль
-    hashed_password = models.User.hash_password(user.password)
+    # Хэшируем пароль в пуле app.crud.passwords, не занимая общий пул обработчиков
+    hashed_password = await passwords.hash_password(user.password)
 
     # Создаем нового пользователя
     db_user = models.User(
@@ -80,15 +159,19 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    token_cache.invalidate(db_user.username)
+    await db.refresh(db_user)
     return db_user
 
 
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not db_user or not db_user.verify_password(form_data.password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(),
+                db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.scalars(select(models.User).where(
+        models.User.username == form_data.username))).first()
+    if not db_user or not await passwords.verify_password(form_data.password,
+                                                          db_user.hashed_password):
         raise HTTPException(status_code=401, detail="Неверное имя или пароль")
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
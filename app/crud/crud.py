@@ -1,75 +1,164 @@
 """
 CRUD-методы для работы с таблицами
 """
-from fastapi import APIRouter, Depends, HTTPException
+import csv
+import io
+import json
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models import models
 from app.schemas import schemas
-from app.db.database import get_db
+from app.db.database import get_async_db, get_db
 from app.crud.auth import get_current_user
+from app.crud.pagination import list_rows
+from app.crud.result_cache import result_cache
+
+TIME_MATRIX_BATCH = 5000
+IMPORT_ERRORS_KEPT = 20
 
 router = APIRouter(tags=["Работа с БД"])
 
+
+def read_csv(file: UploadFile, schema):
+    """Строки CSV-файла с заголовком из имён полей schema как объекты schema."""
+    items = []
+    reader = csv.DictReader(io.TextIOWrapper(file.file, encoding="utf-8-sig"))
+    for line, row in enumerate(reader, start=2):
+        try:
+            items.append(schema(**row))
+        except ValidationError as e:
+            raise HTTPException(status_code=400,
+                                detail=f"Строка {line}: {e.errors()[0]['msg']}")
+    return items
+
+
+def bulk_insert(db: Session, model, rows: list):
+    """Вставляет строки одним пакетным запросом и возвращает их id по порядку."""
+    if not rows:
+        return []
+    ids = db.scalars(insert(model).returning(model.id, sort_by_parameter_order=True),
+                     rows).all()
+    db.commit()
+    return ids
+
+
+def check_locations(db: Session, user_id: int, location_ids: set):
+    """Бросает HTTP 400, если среди location_ids есть чужие или несуществующие локации."""
+    known = {location_id for location_id, in db.query(models.Location.id).filter(
+        models.Location.user_id == user_id)}
+    unknown = sorted(location_ids - known)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Локации не найдены: {unknown[:20]}")
+
+
 #Водители
 @router.post("/drivers/", response_model=schemas.DriverResponse)
-def create_driver(driver: schemas.DriverCreate, db: Session = Depends(get_db),
-                  current_user: dict = Depends(get_current_user)):
+async def create_driver(driver: schemas.DriverCreate, db: AsyncSession = Depends(get_async_db),
+                        current_user: dict = Depends(get_current_user)):
     db_driver = models.Driver(**driver.dict(), user_id=current_user.id)
     db.add(db_driver)
-    db.commit()
-    db.refresh(db_driver)
+    await db.commit()
+    result_cache.invalidate(current_user.id)
+    await db.refresh(db_driver)
     return db_driver
 
 
 @router.get("/drivers/", response_model=list[schemas.DriverResponse])
-def read_drivers(db: Session = Depends(get_db),
-                 current_user: dict = Depends(get_current_user)):
-    return db.query(models.Driver).filter(models.Driver.user_id == current_user.id).all()
+async def read_drivers(page: schemas.PageParams = Depends(), name: str | None = None,
+                       db: AsyncSession = Depends(get_async_db),
+                       current_user: dict = Depends(get_current_user)):
+    conditions = [models.Driver.user_id == current_user.id]
+    if name is not None:
+        conditions.append(models.Driver.name.contains(name))
+    return await list_rows(db, models.Driver, schemas.DriverResponse, conditions, page)
 
 
 @router.delete("/drivers/{driver_id}")
-def delete_driver(driver_id: int, db: Session = Depends(get_db),
-                  current_user: dict = Depends(get_current_user)):
-    driver = db.query(models.Driver).filter(models.Driver.id == driver_id,
-                                   models.Driver.user_id == current_user.id).first()
+async def delete_driver(driver_id: int, db: AsyncSession = Depends(get_async_db),
+                        current_user: dict = Depends(get_current_user)):
+    driver = (await db.scalars(select(models.Driver).where(
+        models.Driver.id == driver_id, models.Driver.user_id == current_user.id))).first()
     if not driver:
         raise HTTPException(status_code=404, detail="Водитель не найден")
-    db.delete(driver)
-    db.commit()
+    await db.delete(driver)
+    await db.commit()
+    result_cache.invalidate(current_user.id)
     return {"status": "Успешно удален", "driver_id": driver_id}
 
 
+@router.post("/drivers/bulk", response_model=schemas.BulkImportResponse)
+def create_drivers(drivers: list[schemas.DriverCreate], db: Session = Depends(get_db),
+                   current_user: dict = Depends(get_current_user)):
+    ids = bulk_insert(db, models.Driver,
+                      [dict(driver.model_dump(), user_id=current_user.id) for driver in drivers])
+    result_cache.invalidate(current_user.id)
+    return {"created": len(ids), "ids": ids}
+
+
+@router.post("/drivers/bulk/csv", response_model=schemas.BulkImportResponse)
+def import_drivers(file: UploadFile = File(...), db: Session = Depends(get_db),
+                   current_user: dict = Depends(get_current_user)):
+    return create_drivers(read_csv(file, schemas.DriverCreate), db, current_user)
+
+
 #Локации
 @router.post("/locations/", response_model=schemas.LocationResponse)
-def create_location(location: schemas.LocationCreate, db: Session = Depends(get_db),
-                    current_user: dict = Depends(get_current_user)):
+async def create_location(location: schemas.LocationCreate,
+                          db: AsyncSession = Depends(get_async_db),
+                          current_user: dict = Depends(get_current_user)):
     db_location = models.Location(**location.dict(), user_id=current_user.id)
     db.add(db_location)
-    db.commit()
-    db.refresh(db_location)
+    await db.commit()
+    result_cache.invalidate(current_user.id)
+    await db.refresh(db_location)
     return db_location
 
 
 @router.get("/locations/", response_model=list[schemas.LocationResponse])
-def read_locations(db: Session = Depends(get_db),
-                   current_user: dict = Depends(get_current_user)):
-    return db.query(models.Location).filter(models.Location.user_id == current_user.id).all()
+async def read_locations(page: schemas.PageParams = Depends(), name: str | None = None,
+                         db: AsyncSession = Depends(get_async_db),
+                         current_user: dict = Depends(get_current_user)):
+    conditions = [models.Location.user_id == current_user.id]
+    if name is not None:
+        conditions.append(models.Location.name.contains(name))
+    return await list_rows(db, models.Location, schemas.LocationResponse, conditions, page)
+
+
+@router.post("/locations/bulk", response_model=schemas.BulkImportResponse)
+def create_locations(locations: list[schemas.LocationCreate], db: Session = Depends(get_db),
+                     current_user: dict = Depends(get_current_user)):
+    ids = bulk_insert(db, models.Location,
+                      [dict(location.model_dump(), user_id=current_user.id)
+                       for location in locations])
+    result_cache.invalidate(current_user.id)
+    return {"created": len(ids), "ids": ids}
+
+
+@router.post("/locations/bulk/csv", response_model=schemas.BulkImportResponse)
+def import_locations(file: UploadFile = File(...), db: Session = Depends(get_db),
+                     current_user: dict = Depends(get_current_user)):
+    return create_locations(read_csv(file, schemas.LocationCreate), db, current_user)
 
 
 #Матрица времени
 @router.post("/time-matrix/", response_model=schemas.TimeMatrixResponse)
-def create_time_matrix(matrix: schemas.TimeMatrixCreate, db: Session = Depends(get_db),
-                       current_user: dict = Depends(get_current_user)):
+async def create_time_matrix(matrix: schemas.TimeMatrixCreate,
+                             db: AsyncSession = Depends(get_async_db),
+                             current_user: dict = Depends(get_current_user)):
     from_id = matrix.from_location_id
     to_id = matrix.to_location_id
     if from_id == to_id:
         raise HTTPException(status_code=400, detail="from_id и to_id не могут совпадать")
     a, b = sorted([from_id, to_id])
-    existing = db.query(models.TimeMatrix).filter(
+    existing = (await db.scalars(select(models.TimeMatrix).where(
         models.TimeMatrix.from_location_id == a,
         models.TimeMatrix.to_location_id == b,
         models.TimeMatrix.user_id == current_user.id
-    ).first()
+    ))).first()
     if existing:
         raise HTTPException(status_code=400, detail="Запись уже существует")
     db_matrix = models.TimeMatrix(
@@ -79,64 +168,253 @@ def create_time_matrix(matrix: schemas.TimeMatrixCreate, db: Session = Depends(g
         user_id=current_user.id
     )
     db.add(db_matrix)
-    db.commit()
-    db.refresh(db_matrix)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Параллельный запрос успел записать ту же пару (уникальный индекс пар).
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Запись уже существует")
+    result_cache.invalidate(current_user.id)
+    await db.refresh(db_matrix)
     return db_matrix
 
 
 @router.get("/time-matrix/", response_model=list[schemas.TimeMatrixResponse])
-def read_time_matrix(db: Session = Depends(get_db),
-                     current_user: dict = Depends(get_current_user)):
-    return db.query(models.TimeMatrix).filter(models.TimeMatrix.user_id == current_user.id).all()
+async def read_time_matrix(page: schemas.PageParams = Depends(), location_id: int | None = None,
+                           db: AsyncSession = Depends(get_async_db),
+                           current_user: dict = Depends(get_current_user)):
+    """location_id - только пары, в которых участвует эта локация."""
+    conditions = [models.TimeMatrix.user_id == current_user.id]
+    if location_id is not None:
+        conditions.append(or_(models.TimeMatrix.from_location_id == location_id,
+                              models.TimeMatrix.to_location_id == location_id))
+    return await list_rows(db, models.TimeMatrix, schemas.TimeMatrixResponse, conditions, page)
 
 
 @router.put("/time-matrix/update", response_model=schemas.TimeMatrixResponse)
-def update_time_matrix(matrix: schemas.TimeMatrixCreate, db: Session = Depends(get_db),
-                       current_user: dict = Depends(get_current_user)):
+async def update_time_matrix(matrix: schemas.TimeMatrixCreate,
+                             db: AsyncSession = Depends(get_async_db),
+                             current_user: dict = Depends(get_current_user)):
     from_id = matrix.from_location_id
     to_id = matrix.to_location_id
     if from_id == to_id:
         raise HTTPException(status_code=400, detail="from_id и to_id не могут совпадать")
     a, b = sorted([from_id, to_id])
-    db_entry = db.query(models.TimeMatrix).filter(
+    db_entry = (await db.scalars(select(models.TimeMatrix).where(
         models.TimeMatrix.from_location_id == a,
         models.TimeMatrix.to_location_id == b,
         models.TimeMatrix.user_id == current_user.id
-    ).first()
+    ))).first()
     if not db_entry:
         raise HTTPException(status_code=404, detail="Запись не найдена")
     db_entry.travel_time = matrix.travel_time
-    db.commit()
-    db.refresh(db_entry)
+    await db.commit()
+    result_cache.invalidate(current_user.id)
+    await db.refresh(db_entry)
     return db_entry
 
 
+def existing_pairs(db: Session, user_id: int, pairs=None):
+    """id записей матрицы по парам (a, b); если pairs задан - только для этих пар."""
+    query = db.query(models.TimeMatrix.id, models.TimeMatrix.from_location_id,
+                     models.TimeMatrix.to_location_id).filter(models.TimeMatrix.user_id == user_id)
+    if pairs is not None:
+        query = query.filter(tuple_(models.TimeMatrix.from_location_id,
+                                    models.TimeMatrix.to_location_id).in_(list(pairs)))
+    return {(a, b): entry_id for entry_id, a, b in query}
+
+
+def write_time_matrix(db: Session, user_id: int, pairs: dict, existing: dict):
+    """
+    Пакетно обновляет пары (a, b) -> travel_time, которые есть в existing,
+    и добавляет остальные. Возвращает (добавлено, обновлено); commit - за вызывающим.
+    """
+    updates = [{"id": existing[pair], "travel_time": travel_time}
+               for pair, travel_time in pairs.items() if pair in existing]
+    inserts = [{"from_location_id": a, "to_location_id": b, "travel_time": travel_time,
+                "user_id": user_id}
+               for (a, b), travel_time in pairs.items() if (a, b) not in existing]
+    if updates:
+        db.execute(update(models.TimeMatrix), updates)
+    if inserts:
+        db.execute(insert(models.TimeMatrix), inserts)
+    return len(inserts), len(updates)
+
+
+@router.post("/time-matrix/bulk", response_model=schemas.BulkImportResponse)
+def upsert_time_matrix(matrix: list[schemas.TimeMatrixCreate], db: Session = Depends(get_db),
+                       current_user: dict = Depends(get_current_user)):
+    """
+    Массовая загрузка матрицы времени: существующие пары (в любом порядке
+    локаций) обновляются, новые добавляются. Существующие записи читаются
+    только для присланных пар, обновление и вставка - пакетные, в одной транзакции.
+    """
+    pairs = {}
+    for k, entry in enumerate(matrix):
+        if entry.from_location_id == entry.to_location_id:
+            raise HTTPException(status_code=400,
+                                detail=f"Запись {k}: from_id и to_id не могут совпадать")
+        a, b = sorted([entry.from_location_id, entry.to_location_id])
+        pairs[(a, b)] = entry.travel_time
+    check_locations(db, current_user.id, {location_id for pair in pairs for location_id in pair})
+
+    # Существующие записи читаются только для присланных пар, частями по
+    # TIME_MATRIX_BATCH, чтобы не превысить лимит параметров запроса.
+    created = updated = 0
+    items = list(pairs.items())
+    for start in range(0, len(items), TIME_MATRIX_BATCH):
+        chunk = dict(items[start:start + TIME_MATRIX_BATCH])
+        counts = write_time_matrix(db, current_user.id, chunk,
+                                   existing_pairs(db, current_user.id, chunk))
+        created += counts[0]
+        updated += counts[1]
+    db.commit()
+    result_cache.invalidate(current_user.id)
+    return {"created": created, "updated": updated}
+
+
+@router.post("/time-matrix/bulk/csv", response_model=schemas.BulkImportResponse)
+def import_time_matrix(file: UploadFile = File(...), db: Session = Depends(get_db),
+                       current_user: dict = Depends(get_current_user)):
+    return upsert_time_matrix(read_csv(file, schemas.TimeMatrixCreate), db, current_user)
+
+
+def time_matrix_rows(file: UploadFile):
+    """
+    Строки загруженного файла по одной: (номер строки, dict или None, если
+    строку не удалось разобрать). Файл с расширением .ndjson/.jsonl читается
+    как NDJSON, остальные - как CSV с заголовком.
+    """
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig")
+    if (file.filename or "").endswith((".ndjson", ".jsonl")):
+        for line, raw in enumerate(text, start=1):
+            if not raw.strip():
+                continue
+            try:
+                row = json.loads(raw)
+            except ValueError:
+                row = None
+            yield line, row if isinstance(row, dict) else None
+    else:
+        for line, row in enumerate(csv.DictReader(text), start=2):
+            yield line, row
+
+
+@router.post("/time-matrix/import", response_model=schemas.TimeMatrixImportResponse)
+def stream_time_matrix(file: UploadFile = File(...), db: Session = Depends(get_db),
+                       current_user: dict = Depends(get_current_user)):
+    """
+    Потоковая загрузка матрицы времени из CSV или NDJSON любого размера:
+    файл читается построчно, пары нормализуются (a < b) и записываются
+    пакетами по TIME_MATRIX_BATCH, поэтому память не зависит от размера файла.
+    Некорректные строки пропускаются; в ответе - их число и первые
+    IMPORT_ERRORS_KEPT описаний. Вся загрузка - одна транзакция.
+    """
+    known = {location_id for location_id, in db.query(models.Location.id).filter(
+        models.Location.user_id == current_user.id)}
+    report = {"rows": 0, "created": 0, "updated": 0, "rejected": 0, "errors": []}
+    batch = {}
+
+    def reject(line, reason):
+        report["rejected"] += 1
+        if len(report["errors"]) < IMPORT_ERRORS_KEPT:
+            report["errors"].append(f"Строка {line}: {reason}")
+
+    def flush():
+        created, updated = write_time_matrix(db, current_user.id, batch,
+                                             existing_pairs(db, current_user.id, batch))
+        report["created"] += created
+        report["updated"] += updated
+        batch.clear()
+
+    for line, row in time_matrix_rows(file):
+        report["rows"] += 1
+        # Та же схема, что и у /time-matrix/bulk: одинаковые правила проверки.
+        try:
+            entry = schemas.TimeMatrixCreate.model_validate(row)
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = ".".join(str(part) for part in error["loc"])
+            reject(line, f"{field}: {error['msg']}" if field else error["msg"])
+            continue
+        from_id, to_id, travel_time = (entry.from_location_id, entry.to_location_id,
+                                       entry.travel_time)
+        if from_id == to_id:
+            reject(line, "from_id и to_id не могут совпадать")
+        elif from_id not in known or to_id not in known:
+            reject(line, "локация не найдена")
+        else:
+            batch[(min(from_id, to_id), max(from_id, to_id))] = travel_time
+            if len(batch) >= TIME_MATRIX_BATCH:
+                flush()
+    if batch:
+        flush()
+    db.commit()
+    result_cache.invalidate(current_user.id)
+    return report
+
+
 #Маршруты
 @router.post("/routes/", response_model=schemas.RouteResponse)
-def create_route(route: schemas.RouteCreate, db: Session = Depends(get_db),
-                 current_user: dict = Depends(get_current_user)):
+async def create_route(route: schemas.RouteCreate, db: AsyncSession = Depends(get_async_db),
+                       current_user: dict = Depends(get_current_user)):
     db_route = models.Route(**route.dict(), user_id=current_user.id)
     db.add(db_route)
-    db.commit()
-    db.refresh(db_route)
+    await db.commit()
+    result_cache.invalidate(current_user.id)
+    await db.refresh(db_route)
     return db_route
 
 
 @router.get("/routes/", response_model=list[schemas.RouteResponse])
-def read_routes(db: Session = Depends(get_db),
-                current_user: dict = Depends(get_current_user)):
-    return db.query(models.Route).filter(models.Route.user_id == current_user.id).all()
+async def read_routes(page: schemas.PageParams = Depends(), location_id: int | None = None,
+                      time_from: str | None = Query(None, pattern=schemas.TIME_PATTERN),
+                      time_to: str | None = Query(None, pattern=schemas.TIME_PATTERN),
+                      db: AsyncSession = Depends(get_async_db),
+                      current_user: dict = Depends(get_current_user)):
+    """
+    location_id - маршруты из этой локации или в неё;
+    time_from, time_to (HH:MM) - окно времени отправления включительно.
+    """
+    conditions = [models.Route.user_id == current_user.id]
+    if location_id is not None:
+        conditions.append(or_(models.Route.start_location_id == location_id,
+                              models.Route.end_location_id == location_id))
+    if time_from is not None:
+        conditions.append(models.Route.time >= time_from)
+    if time_to is not None:
+        conditions.append(models.Route.time <= time_to)
+    return await list_rows(db, models.Route, schemas.RouteResponse, conditions, page)
+
+
+@router.post("/routes/bulk", response_model=schemas.BulkImportResponse)
+def create_routes(routes: list[schemas.RouteCreate], db: Session = Depends(get_db),
+                  current_user: dict = Depends(get_current_user)):
+    check_locations(db, current_user.id,
+                    {location_id for route in routes
+                     for location_id in (route.start_location_id, route.end_location_id)})
+    ids = bulk_insert(db, models.Route,
+                      [dict(route.model_dump(), user_id=current_user.id) for route in routes])
+    result_cache.invalidate(current_user.id)
+    return {"created": len(ids), "ids": ids}
+
+
+@router.post("/routes/bulk/csv", response_model=schemas.BulkImportResponse)
+def import_routes(file: UploadFile = File(...), db: Session = Depends(get_db),
+                  current_user: dict = Depends(get_current_user)):
+    return create_routes(read_csv(file, schemas.RouteCreate), db, current_user)
 
 
 @router.delete("/routes/{route_id}")
-def delete_route(route_id: int, db: Session = Depends(get_db),
-                 current_user: dict = Depends(get_current_user)):
-    route = db.query(models.Route).filter(
+async def delete_route(route_id: int, db: AsyncSession = Depends(get_async_db),
+                       current_user: dict = Depends(get_current_user)):
+    route = (await db.scalars(select(models.Route).where(
         models.Route.id == route_id,
         models.Route.user_id == current_user.id
-    ).first()
+    ))).first()
     if not route:
         raise HTTPException(status_code=404, detail="Маршрут не найден")
-    db.delete(route)
-    db.commit()
+    await db.delete(route)
+    await db.commit()
+    result_cache.invalidate(current_user.id)
     return {"status": "Успешно удален", "route_id": route_id}
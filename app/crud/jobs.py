@@ -0,0 +1,115 @@
+"""
+Фоновая генерация расписания: задача ставится в очередь и выполняется
+в отдельном пуле, клиент опрашивает её статус.
+
+Задачи хранятся в памяти процесса: при запуске нескольких процессов
+(uvicorn --workers N) опрос должен попадать в тот же процесс, что и создание
+задачи (sticky-сессии на балансировщике), иначе ответ - 404.
+
+Хранятся до SCHEDULE_JOBS_KEPT задач; при переполнении вытесняются самые
+старые завершённые, а если все задачи ещё выполняются, новая не принимается (503).
+"""
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, Depends, HTTPException
+from app.schemas import schemas
+from app.db.database import SessionLocal
+from app.crud.auth import get_current_user
+from app.crud.schedule import (GENERATION_FAILED, load_instance, save_schedule,
+                               schedule_config, solve_cached)
+
+SCHEDULE_JOB_WORKERS = int(os.getenv("SCHEDULE_JOB_WORKERS", "2"))
+SCHEDULE_JOBS_KEPT = 1000
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=SCHEDULE_JOB_WORKERS,
+                              thread_name_prefix="schedule-job")
+jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+router = APIRouter(tags=["Генерация и просмотр расписания"])
+
+
+class ScheduleJob:
+    """
+    Задача генерации расписания.
+
+    Атрибуты:
+        id (str): Идентификатор задачи.
+        user_id (int): Идентификатор пользователя.
+        status (str): queued, running, done или failed.
+        progress (dict): Последняя сводка поколения (generation, best_score, mean_score).
+        result (dict): Расписание и статистика запуска после завершения.
+        error (str): Текст ошибки, если задача не выполнена: сообщение ValueError
+            (например, не хватает водителей) или общий GENERATION_FAILED.
+    """
+
+    def __init__(self, user_id: int, params: dict):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.params = params
+        self.status = "queued"
+        self.progress = None
+        self.result = None
+        self.error = None
+
+    def update_progress(self, progress: dict):
+        self.progress = dict(progress, generations=self.params["generations"])
+
+
+def run_job(job: ScheduleJob, session_factory=SessionLocal):
+    job.status = "running"
+    db = session_factory()
+    try:
+        instance = load_instance(db, job.user_id)
+        result, stats, cached = solve_cached(instance, schedule_config(db, job.user_id, job.params),
+                                             job.user_id, callback=job.update_progress)
+        save_schedule(db, job.user_id, result)
+        job.result = {"schedule": result, "stats": stats, "cached": cached}
+        job.status = "done"
+    except ValueError as e:
+        job.error = str(e)
+        job.status = "failed"
+    except Exception:
+        # Подробности (SQL, пути) - только в лог, клиент получает общее сообщение.
+        logger.exception("Задача генерации расписания %s завершилась ошибкой", job.id)
+        job.error = GENERATION_FAILED
+        job.status = "failed"
+    finally:
+        db.close()
+
+
+def get_job(job_id: str, user_id: int) -> ScheduleJob:
+    job = jobs.get(job_id)
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+
+@router.post("/schedule-jobs", response_model=schemas.ScheduleJobResponse, status_code=202)
+def create_schedule_job(params: schemas.ScheduleParams = Depends(),
+                        current_user: dict = Depends(get_current_user)):
+    job = ScheduleJob(current_user.id, params.model_dump())
+    with _jobs_lock:
+        if len(jobs) >= SCHEDULE_JOBS_KEPT:
+            # Вытесняются только завершённые задачи: выполняющуюся клиент ещё опрашивает.
+            finished = [job_id for job_id, old in jobs.items()
+                        if old.status in ("done", "failed")]
+            for job_id in finished[:len(jobs) - SCHEDULE_JOBS_KEPT + 1]:
+                del jobs[job_id]
+        if len(jobs) >= SCHEDULE_JOBS_KEPT:
+            raise HTTPException(status_code=503, detail="Слишком много задач в работе",
+                                headers={"Retry-After": "10"})
+        jobs[job.id] = job
+    executor.submit(run_job, job)
+    return job
+
+
+@router.get("/schedule-jobs/{job_id}", response_model=schemas.ScheduleJobResponse)
+def read_schedule_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    return get_job(job_id, current_user.id)
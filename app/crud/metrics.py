@@ -0,0 +1,39 @@
+"""
+Метрики процесса в текстовом формате Prometheus.
+
+Если задан METRICS_TOKEN, /metrics отвечает только на запросы с заголовком
+Authorization: Bearer <METRICS_TOKEN>; без него эндпоинт открыт, и доступ
+к нему нужно закрыть на уровне сети (firewall, reverse proxy).
+"""
+import os
+import secrets
+
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app.crud.auth import token_cache
+from app.crud.result_cache import result_cache
+from app.metrics import metrics
+
+# Токен для сбора метрик; пока не задан, /metrics доступен без авторизации
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+router = APIRouter(tags=["Метрики"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(authorization: str = Header("")):
+    """
+    Счётчики и гистограммы длительностей для Prometheus: HTTP-запросы,
+    этапы генерации расписания и генетического алгоритма, кэши.
+    """
+    if METRICS_TOKEN and not secrets.compare_digest(
+            authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Неверный токен метрик",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    metrics.set("result_cache_entries", len(result_cache))
+    metrics.set("token_cache_entries", len(token_cache))
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
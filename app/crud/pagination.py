@@ -0,0 +1,49 @@
+"""
+Постраничная выдача списков: keyset-пагинация по id и потоковый
+режим NDJSON, читающий строки из курсора частями
+"""
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import SessionLocal
+
+STREAM_CHUNK = 1000
+
+
+async def list_rows(db: AsyncSession, model, schema, conditions: list, page):
+    """
+    Строки model, удовлетворяющие conditions, в порядке id.
+
+    page (PageParams): limit - размер страницы, after_id - id последней строки
+    предыдущей страницы, format - json (список; если страница заполнена,
+    заголовок X-Next-After-Id указывает курсор следующей) или ndjson
+    (по объекту в строке, без накопления всего результата в памяти).
+    """
+    statement = select(model).where(*conditions).order_by(model.id)
+    if page.after_id is not None:
+        statement = statement.where(model.id > page.after_id)
+    if page.limit is not None:
+        statement = statement.limit(page.limit)
+
+    if page.format == "ndjson":
+        return StreamingResponse(stream_ndjson(statement, schema),
+                                 media_type="application/x-ndjson")
+
+    rows = (await db.scalars(statement)).all()
+    headers = {}
+    if page.limit is not None and len(rows) == page.limit:
+        headers["X-Next-After-Id"] = str(rows[-1].id)
+    return JSONResponse([schema.model_validate(row).model_dump() for row in rows],
+                        headers=headers)
+
+
+def stream_ndjson(statement, schema):
+    # Сессия запроса закрывается до отправки ответа, поэтому у потока своя.
+    session = SessionLocal()
+    try:
+        rows = session.scalars(statement.execution_options(yield_per=STREAM_CHUNK))
+        for row in rows:
+            yield schema.model_validate(row).model_dump_json() + "\n"
+            session.expunge(row)
+    finally:
+        session.close()
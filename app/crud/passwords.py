@@ -0,0 +1,40 @@
+"""
+Хэширование и проверка паролей в отдельном ограниченном пуле потоков:
+bcrypt занимает сотни миллисекунд CPU и не должен занимать общий пул
+обработчиков запросов
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from app.models import models
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Сколько операций (выполняемых и ожидающих) допускается одновременно;
+# сверх этого запрос сразу получает 503, а не ждёт в очереди.
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "64"))
+
+executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="password")
+_slots = threading.BoundedSemaphore(PASSWORD_QUEUE_LIMIT)
+
+
+async def run_in_password_pool(function, *args):
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(status_code=503, detail="Сервер перегружен, повторите попытку позже",
+                            headers={"Retry-After": "1"})
+    try:
+        future = executor.submit(function, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return await asyncio.wrap_future(future)
+
+
+async def hash_password(password: str) -> str:
+    return await run_in_password_pool(models.User.hash_password, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await run_in_password_pool(models.pwd_context.verify, password, hashed_password)
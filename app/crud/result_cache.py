@@ -0,0 +1,112 @@
+"""
+Кэш готовых расписаний: ключ - хэш входных данных пользователя
+(водители, маршруты, матрица времени) и параметров алгоритма,
+поэтому повторная генерация без изменений не запускает эволюцию
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from hashlib import blake2b
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "128"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+# Путь к файлу SQLite для второго уровня кэша; если не задан - только память.
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB")
+
+
+def problem_digest(instance, config):
+    """Устойчивый хэш задачи (ProblemInstance) и параметров запуска (GAConfig)."""
+    digest = blake2b(digest_size=20)
+    digest.update(json.dumps([instance.driver_ids, instance.driver_names, instance.genes,
+                              instance.locations, asdict(config)],
+                             sort_keys=True, ensure_ascii=False).encode())
+    digest.update(instance.travel.tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU-кэш результатов с ограниченным временем жизни и необязательным
+    вторым уровнем в SQLite (переживает перезапуск и общий для процессов).
+
+    Атрибуты:
+        maxsize (int): Максимальное число результатов в памяти.
+        ttl (float): Время жизни результата в секундах.
+        path (str | None): Файл SQLite второго уровня.
+        hits (int): Число найденных результатов.
+        misses (int): Число промахов.
+    """
+
+    def __init__(self, maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL, path=RESULT_CACHE_DB):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, "
+                             "user_id INTEGER, expires REAL, value TEXT)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_results_user ON results (user_id)")
+            self._db.commit()
+
+    def _remember(self, key, user_id, expires, value):
+        self._entries[key] = (user_id, expires, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT user_id, expires, value FROM results "
+                                       "WHERE key = ? AND expires > ?", (key, now)).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1], json.loads(row[2]))
+                    self._remember(key, *entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, key, user_id, value):
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, user_id, expires, value)
+            if self._db is not None:
+                self._db.execute("DELETE FROM results WHERE expires <= ?", (time.time(),))
+                self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                 (key, user_id, expires, json.dumps(value, ensure_ascii=False)))
+                self._db.commit()
+
+    def invalidate(self, user_id):
+        """Удаляет результаты пользователя после изменения его данных."""
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[0] == user_id]:
+                del self._entries[key]
+            if self._db is not None:
+                self._db.execute("DELETE FROM results WHERE user_id = ?", (user_id,))
+                self._db.commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {"result_cache_hits": self.hits, "result_cache_misses": self.misses}
+
+
+result_cache = ResultCache()
@@ -1,60 +1,242 @@
 """
 CRUD-методы для работы с расписанием
 """
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import logging
+import queue
+import threading
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models import models
-from app.db.database import get_db
+from app.schemas import schemas
+from app.db.database import get_async_db, get_db, SessionLocal
 from app.crud.auth import get_current_user
+from app.crud.pagination import list_rows
+from app.crud.result_cache import problem_digest, result_cache
+from app.metrics import metrics, profiled, profiling_allowed, record_solve
+
+# Ответ клиенту при непредвиденной ошибке генерации; подробности - только в логе
+GENERATION_FAILED = "Внутренняя ошибка при генерации расписания"
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["Генерация и просмотр расписания"])
 
 
-@router.get("/get-schedule")
-def get_schedule(db: Session = Depends(get_db),
-                 current_user: dict = Depends(get_current_user)):
-    schedule = db.query(models.Schedule).filter(models.Schedule.user_id == current_user.id).all()
-    if not schedule:
+@router.get("/get-schedule", response_model=list[schemas.ScheduleResponse])
+async def get_schedule(page: schemas.PageParams = Depends(), driver_name: str | None = None,
+                       time_from: str | None = Query(None, pattern=schemas.TIME_PATTERN),
+                       time_to: str | None = Query(None, pattern=schemas.TIME_PATTERN),
+                       db: AsyncSession = Depends(get_async_db),
+                       current_user: dict = Depends(get_current_user)):
+    """
+    driver_name - маршруты одного водителя;
+    time_from, time_to (HH:MM) - окно времени отправления включительно.
+    """
+    exists = (await db.scalars(select(models.Schedule.id).where(
+        models.Schedule.user_id == current_user.id).limit(1))).first()
+    if exists is None:
         raise HTTPException(status_code=404, detail="Расписание не найдено")
-    return schedule
+    conditions = [models.Schedule.user_id == current_user.id]
+    if driver_name is not None:
+        conditions.append(models.Schedule.driver_name == driver_name)
+    if time_from is not None:
+        conditions.append(models.Schedule.time >= time_from)
+    if time_to is not None:
+        conditions.append(models.Schedule.time <= time_to)
+    return await list_rows(db, models.Schedule, schemas.ScheduleResponse, conditions, page)
 
 
 @router.post("/clear-schedule")
-def clear_schedule(db: Session = Depends(get_db),
-                   current_user: dict = Depends(get_current_user)):
-    db.query(models.Schedule).filter(models.Schedule.user_id == current_user.id).delete()
-    db.commit()
+async def clear_schedule(db: AsyncSession = Depends(get_async_db),
+                         current_user: dict = Depends(get_current_user)):
+    await db.execute(delete(models.Schedule).where(models.Schedule.user_id == current_user.id))
+    await db.commit()
     return {"status": "Расписание очищено"}
 
 
+def load_instance(db: Session, user_id: int):
+    """
+    Собирает задачу для генетического алгоритма из данных пользователя.
+    Данные читаются четырьмя запросами только нужных столбцов: строки - простые
+    кортежи, не привязанные к сессии, поэтому ленивых загрузок связей нет
+    и число запросов не зависит от числа маршрутов.
+    """
+    from app.genetic.instance import ProblemInstance
+
+    drivers_db = db.query(models.Driver.id, models.Driver.name).filter(
+        models.Driver.user_id == user_id).order_by(models.Driver.id).all()
+    locations_db = db.query(models.Location.id, models.Location.name).filter(
+        models.Location.user_id == user_id).all()
+    time_matrix_db = db.query(models.TimeMatrix.from_location_id,
+                              models.TimeMatrix.to_location_id,
+                              models.TimeMatrix.travel_time).filter(
+        models.TimeMatrix.user_id == user_id).all()
+    routes_db = db.query(models.Route.id, models.Route.start_location_id,
+                         models.Route.end_location_id, models.Route.time).filter(
+        models.Route.user_id == user_id).all()
+    return ProblemInstance(drivers_db, locations_db, time_matrix_db, routes_db)
+
+
+def load_previous(db: Session, user_id: int):
+    """
+    Сохранённое расписание пользователя как route_id -> driver_id.
+    В Schedule хранится имя водителя, поэтому водитель ищется по имени;
+    маршруты удалённых или переименованных водителей не попадают в результат.
+    """
+    driver_ids = {}
+    for driver_id, name in db.query(models.Driver.id, models.Driver.name).filter(
+            models.Driver.user_id == user_id).order_by(models.Driver.id):
+        driver_ids.setdefault(name, driver_id)
+    previous = {}
+    for route_id, driver_name in db.query(models.Schedule.route_id,
+                                          models.Schedule.driver_name).filter(
+            models.Schedule.user_id == user_id):
+        if driver_name in driver_ids:
+            previous[route_id] = driver_ids[driver_name]
+    return previous
+
+
+def schedule_config(db: Session, user_id: int, params: dict):
+    """GAConfig из параметров запроса; warm_start заменяется сохранённым расписанием."""
+    from app.genetic.algorithm import GAConfig
+
+    params = dict(params)
+    params["warm_start"] = load_previous(db, user_id) if params.get("warm_start") else None
+    return GAConfig(**params)
+
+
+def solve_cached(instance, config, user_id: int, callback=None):
+    """
+    solve() с кэшем результатов: при тех же данных и параметрах расписание
+    берётся из result_cache без запуска эволюции.
+    Возвращает (расписание, статистика, найдено ли в кэше).
+    """
+    from app.genetic.algorithm import solve
+
+    key = problem_digest(instance, config)
+    cached = result_cache.get(key)
+    metrics.inc("result_cache_requests_total", result="hit" if cached is not None else "miss")
+    if cached is not None:
+        return cached["schedule"], cached["stats"], True
+    result, stats = solve(instance, config, callback=callback)
+    record_solve(stats)
+    result_cache.put(key, user_id, {"schedule": result, "stats": stats})
+    return result, stats, False
+
+
+def save_schedule(db: Session, user_id: int, result: list):
+    """
+    Заменяет сохранённое расписание пользователя результатом алгоритма.
+    Удаление и вставка выполняются в одной транзакции, строки вставляются
+    одним пакетным INSERT (executemany), поэтому читатели не видят
+    пустого или частично записанного расписания.
+    """
+    rows = [{
+        "driver_name": driver_result["driver"],
+        "route_id": route["route.id"],
+        "time": route["time"],
+        "end_time": route["end_time"],
+        "user_id": user_id,
+    } for driver_result in result for route in driver_result["routes"]]
+    db.execute(delete(models.Schedule).where(models.Schedule.user_id == user_id))
+    if rows:
+        db.execute(insert(models.Schedule), rows)
+    db.commit()
+
+
 @router.get("/generate-schedule")
-def generate_schedule(db: Session = Depends(get_db),
+def generate_schedule(response: Response,
+                      params: schemas.ScheduleParams = Depends(),
+                      x_profile: bool = Header(False),
+                      db: Session = Depends(get_db),
                       current_user: dict = Depends(get_current_user)):
-    drivers_db = db.query(models.Driver).filter(models.Driver.user_id == current_user.id).all()
-    locations_db = db.query(models.Location).filter(models.Location.user_id == current_user.id).all()
-    time_matrix_db = db.query(models.TimeMatrix).filter(models.TimeMatrix.user_id == current_user.id).all()
-    routes_db = db.query(models.Route).filter(models.Route.user_id == current_user.id).all()
+    """
+    Длительность этапов (load, solve, save) попадает в гистограмму
+    schedule_stage_seconds на /metrics. С заголовком X-Profile: 1 запрос
+    пользователя из PROFILE_USERS (при заданном PROFILE_DIR) профилируется
+    через cProfile, имя файла профиля возвращается в заголовке X-Profile-Dump.
+    """
+    enabled = x_profile and profiling_allowed(current_user.username)
+    with profiled("generate-schedule", enabled) as dump:
+        try:
+            with metrics.span("schedule_stage_seconds", stage="load"):
+                instance = load_instance(db, current_user.id)
+                config = schedule_config(db, current_user.id, params.model_dump())
+            with metrics.span("schedule_stage_seconds", stage="solve"):
+                result, stats, cached = solve_cached(instance, config, current_user.id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        with metrics.span("schedule_stage_seconds", stage="save"):
+            save_schedule(db, current_user.id, result)
+    if dump["file"]:
+        response.headers["X-Profile-Dump"] = dump["file"]
+    return {"schedule": result, "stats": stats, "cached": cached}
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-    from app.genetic.algorithm import run_genetic_algorithm
+
+@router.get("/generate-schedule/stream")
+def stream_schedule(params: schemas.ScheduleParams = Depends(),
+                    every: int = Query(50, ge=1),
+                    db: Session = Depends(get_db),
+                    current_user: dict = Depends(get_current_user)):
+    """
+    Генерация расписания с прогрессом в формате Server-Sent Events:
+    событие progress после каждого поколения (лучшая и средняя оценка,
+    раз в every поколений - текущее лучшее расписание), затем result или error
+    (текст ValueError, например нехватка водителей, или общий GENERATION_FAILED).
+    Если клиент отключился, эволюция останавливается и расписание не сохраняется.
+    """
+    from app.genetic.algorithm import solve
 
     try:
-        result = run_genetic_algorithm(drivers_db, locations_db, time_matrix_db, routes_db)
+        instance = load_instance(db, current_user.id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    config = schedule_config(db, current_user.id, params.model_dump())
+    user_id = current_user.id
 
-    db.query(models.Schedule).filter(models.Schedule.user_id == current_user.id).delete()
-    db.commit()
+    events = queue.Queue()
+    disconnected = threading.Event()
 
-    for driver_result in result:
-        driver_name = driver_result["driver"]
-        for route in driver_result["routes"]:
-            schedule_entry = models.Schedule(
-                driver_name=driver_name,
-                route_id=route["route.id"],
-                time=route["time"],
-                end_time=route["end_time"],
-                user_id=current_user.id
-            )
-            db.add(schedule_entry)
-    db.commit()
-    return {"schedule": result}
+    def on_progress(progress):
+        events.put(("progress", progress))
+        return disconnected.is_set()
+
+    def run():
+        try:
+            result, stats = solve(instance, config, callback=on_progress, snapshot_every=every)
+            record_solve(stats)
+            if disconnected.is_set():
+                return
+            session = SessionLocal()
+            try:
+                save_schedule(session, user_id, result)
+            finally:
+                session.close()
+            events.put(("result", {"schedule": result, "stats": stats}))
+        except ValueError as e:
+            events.put(("error", {"detail": str(e)}))
+        except Exception:
+            logger.exception("Потоковая генерация расписания завершилась ошибкой")
+            events.put(("error", {"detail": GENERATION_FAILED}))
+        finally:
+            events.put(None)
+
+    def stream():
+        threading.Thread(target=run, daemon=True).start()
+        try:
+            while (item := events.get()) is not None:
+                yield sse_event(*item)
+        finally:
+            disconnected.set()
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
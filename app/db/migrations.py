@@ -0,0 +1,110 @@
+"""
+Обновление схемы существующей БД: create_all создаёт только недостающие
+таблицы, а индексы, добавленные в модели позже, нужно досоздать.
+
+Время маршрутов и расписаний в формате H:MM (записанное до проверки
+формата HH:MM) дополняется ведущим нулём, чтобы фильтры по времени,
+сравнивающие строки, работали и для старых записей.
+
+Удаление данных при запуске приложения не выполняется: если уникальный
+индекс матрицы времени не создать из-за дубликатов, они удаляются только
+явным шагом миграции:
+
+    python -m app.db.migrations --remove-duplicate-pairs
+"""
+import argparse
+import logging
+from sqlalchemy import inspect, text
+from app.db.database import Base
+
+logger = logging.getLogger(__name__)
+
+# Сколько удаляемых групп дубликатов перечисляется в логе поимённо
+DUPLICATES_LOGGED = 50
+
+
+def duplicate_pairs(connection):
+    """
+    Пары локаций пользователя, записанные в матрицу времени больше одного раза:
+    (user_id, from_location_id, to_location_id, число записей, id сохраняемой записи).
+    """
+    return connection.execute(text(
+        "SELECT user_id, from_location_id, to_location_id, COUNT(*), MAX(id) FROM time_matrix "
+        "GROUP BY user_id, from_location_id, to_location_id HAVING COUNT(*) > 1")).all()
+
+
+def remove_duplicate_pairs(connection):
+    """
+    Оставляет по одной записи (последней добавленной) на пару локаций
+    пользователя - иначе уникальный индекс матрицы времени не создать.
+    Число удалённых записей и сохранённые записи пишутся в лог.
+    Возвращает число удалённых записей.
+    """
+    groups = duplicate_pairs(connection)
+    for user_id, a, b, count, kept_id in groups[:DUPLICATES_LOGGED]:
+        logger.warning("time_matrix: пользователь %s, пара (%s, %s): оставлена запись %s, "
+                       "удалено %s", user_id, a, b, kept_id, count - 1)
+    result = connection.execute(text(
+        "DELETE FROM time_matrix WHERE id NOT IN ("
+        "SELECT MAX(id) FROM time_matrix GROUP BY user_id, from_location_id, to_location_id)"))
+    logger.warning("time_matrix: удалено дубликатов %s в %s парах", result.rowcount, len(groups))
+    return result.rowcount
+
+
+def normalize_times(connection):
+    """Приводит время H:MM в маршрутах и расписаниях к HH:MM; возвращает число записей."""
+    updated = 0
+    for table in ("routes", "schedules"):
+        result = connection.execute(text(
+            f"UPDATE {table} SET time = '0' || time WHERE time LIKE '_:__'"))
+        updated += result.rowcount
+    if updated:
+        logger.info("Время приведено к HH:MM в %s записях", updated)
+    return updated
+
+
+def upgrade(engine, remove_duplicates=False):
+    """
+    Создаёт таблицы и индексы моделей, которых ещё нет в БД.
+    Безопасно вызывать при каждом запуске. Возвращает имена созданных индексов.
+
+    Если в матрице времени есть повторы пар, уникальный индекс пропускается
+    с предупреждением в логе; с remove_duplicates=True повторы удаляются
+    (остаётся последняя запись) и индекс создаётся.
+    """
+    Base.metadata.create_all(bind=engine)
+    created = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing:
+                    continue
+                if index.unique and table.name == "time_matrix" and duplicate_pairs(connection):
+                    if not remove_duplicates:
+                        logger.warning(
+                            "Индекс %s не создан: в time_matrix есть повторы пар. "
+                            "Выполните python -m app.db.migrations --remove-duplicate-pairs",
+                            index.name)
+                        continue
+                    remove_duplicate_pairs(connection)
+                index.create(connection)
+                created.append(index.name)
+        normalize_times(connection)
+    return created
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Обновление схемы БД")
+    parser.add_argument("--remove-duplicate-pairs", action="store_true",
+                        help="удалить повторы пар матрицы времени (остаётся последняя запись)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from app.db.database import engine
+    print("Созданы индексы:", ", ".join(upgrade(engine, args.remove_duplicate_pairs)) or "нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,127 @@
 Генетический алгоритм для генерации расписания
 """
 import random
+import time
+from array import array
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta
 
+from app.genetic.cache import FITNESS_CACHE_SIZE, FitnessCache, assignment_key
+from app.genetic.instance import ProblemInstance
+from app.metrics import Timings
+
+ENGINES = ("python", "numpy", "delta")
+
+PENALTY_PER_TIME = 100
+PENALTY_PER_NUMBER = 1
+
+POPULATION_SIZE = 200
+GENERATIONS = 1000
+MUTATION_PROB = 0.1
+
+# Тип элемента хромосомы: индекс водителя в instance.driver_ids (до 65535 водителей)
+GENE_TYPECODE = "H"
+
+
+@dataclass
+class GAConfig:
+    """
+    Параметры запуска генетического алгоритма.
+
+    Атрибуты:
+        engine (str): Движок эволюции, один из ENGINES.
+        population_size (int): Размер популяции (каждого острова).
+        generations (int): Число поколений.
+        mutation_prob (float): Вероятность мутации на ген.
+        fitness_cache_size (int): Размер LRU-кэша оценок движка "python".
+        seed (int | None): Зерно генератора случайных чисел для воспроизводимости.
+        islands (int): Число островов; больше 1 - островная модель (app.genetic.islands).
+        migration_interval (int): Число поколений между миграциями.
+        migrants (int): Сколько лучших особей острова переходит к соседу.
+        workers (int | None): Сколько островов выполняется одновременно (по умолчанию -
+            все); процессов в общем пуле островов в любом случае не больше числа ядер.
+        time_budget (float | None): Ограничение времени работы в секундах.
+        stagnation_limit (int | None): Остановка после стольких поколений без
+            улучшения лучшей оценки.
+        target_score (int | None): Остановка, как только лучшая оценка достигла
+            этого значения (0 - расписание без штрафов).
+        presolve (bool): Проверить до запуска, хватает ли водителей (app.genetic.presolve).
+        greedy_fraction (float): Доля начальной популяции, построенная жадной
+            эвристикой (app.genetic.seeding); остальные особи случайные.
+        local_search_elites (int): Сколько лучших особей каждого поколения улучшать
+            локальным поиском (app.genetic.local_search); 0 - без локального поиска.
+        polish (bool): Улучшить итоговую лучшую особь локальным поиском.
+        warm_start (dict | None): Предыдущее расписание (route_id -> driver_id),
+            из которого строится часть начальной популяции.
+        warm_fraction (float): Доля начальной популяции из предыдущего расписания
+            и его мутаций (при заданном warm_start).
+    """
+    engine: str = "python"
+    population_size: int = POPULATION_SIZE
+    generations: int = GENERATIONS
+    mutation_prob: float = MUTATION_PROB
+    fitness_cache_size: int = FITNESS_CACHE_SIZE
+    seed: int | None = None
+    islands: int = 1
+    migration_interval: int = 50
+    migrants: int = 2
+    workers: int | None = None
+    time_budget: float | None = None
+    stagnation_limit: int | None = None
+    target_score: int | None = None
+    presolve: bool = True
+    greedy_fraction: float = 0.0
+    local_search_elites: int = 0
+    polish: bool = False
+    warm_start: dict | None = None
+    warm_fraction: float = 0.5
+
+
+class EarlyStop:
+    """
+    Критерии досрочной остановки из GAConfig. Причина остановки попадает
+    в статистику запуска как stop_reason: generations (выполнены все поколения),
+    target_score, stagnation, time_budget или callback.
+
+    deadline - момент time.monotonic(), когда истекает time_budget (или None);
+    часы time.monotonic() общие для процессов одной машины, поэтому deadline
+    можно передавать в процессы островов.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.started = time.monotonic()
+        self.deadline = (self.started + config.time_budget
+                         if config.time_budget is not None else None)
+        self.best_score = None
+        self.stale = 0
+
+    @property
+    def active(self):
+        return (self.config.target_score is not None or
+                self.config.stagnation_limit is not None or
+                self.config.time_budget is not None)
+
+    def check(self, best_score, generations=1):
+        """Причина остановки после очередных generations поколений или None."""
+        config = self.config
+        if config.target_score is not None and best_score >= config.target_score:
+            return "target_score"
+        if self.best_score is None or best_score > self.best_score:
+            self.best_score = best_score
+            self.stale = 0
+        else:
+            self.stale += generations
+        if config.stagnation_limit is not None and self.stale >= config.stagnation_limit:
+            return "stagnation"
+        if self.expired():
+            return "time_budget"
+        return None
+
+    def expired(self):
+        """Истёк ли time_budget."""
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
 
 def time_str_to_minutes(t):
     return datetime.strptime(t, "%H:%M")
@@ -13,126 +132,179 @@ def minutes_to_time_str(dt):
     return dt.strftime("%H:%M")
 
 
-def run_genetic_algorithm(drivers_db, locations_db, time_matrix_db, routes_db):
-    if not drivers_db or not locations_db or not time_matrix_db or not routes_db:
-        raise ValueError("Недостающие данные для расчета")
-
-    def create_individual():
-        unsorted = list({
-            "route.id": route.id,
-            "start": route.start_location.name,
-            "end": route.end_location.name,
-            "time": route.time,
-            "start.id": route.start_location_id,
-            "end.id": route.end_location_id,
-            "driver.id": None
-        } for route in routes_db)
-        for __ in unsorted:
-            _ = random.choice(drivers_db)
-            __["driver.id"] = _.id
-        individual = sorted(unsorted, key=lambda r: time_str_to_minutes(r["time"]))
-        return individual
-
-    time_matrix = {}
-    for tm in time_matrix_db:
-        time_matrix[(tm.from_location_id, tm.to_location_id)] = tm.travel_time
-
-    def get_travel_time(a, b):
-        if a == b:
-            return 0
-        x, y = sorted([a, b])
-        return time_matrix.get((x, y), 30)
-
-    def grade(individual):
-        score = 0
-        penalty_per_time = 100
-        penalty_per_number = 1
-        extra_time = 10
-        ideal_per_driver = len(routes_db) / len(drivers_db)
-        driver_count = {}
-        for _ in drivers_db:
-            driver_count[_.id] = 0
-        for _ in individual:
-            driver_count[_["driver.id"]] += 1
-        for _ in drivers_db:
-            delta = abs(driver_count[_.id] - ideal_per_driver)
-            if not delta < 1:
-                score -= int(delta * penalty_per_number)
-        last_end_time = {}
-        last_end_loc = {}
-        for _ in drivers_db:
-            last_end_time[_.id] = None
-            last_end_loc[_.id] = None
-        for driver_route in individual:
-            start_time = time_str_to_minutes(driver_route["time"])
-            travel_duration = get_travel_time(driver_route["start.id"], driver_route["end.id"])
-            end_time = start_time + timedelta(minutes=travel_duration)
-            if (last_end_time[driver_route["driver.id"]] is not None and
-                last_end_loc[driver_route["driver.id"]] is not None):
-                transfer_time = get_travel_time(last_end_loc[driver_route["driver.id"]],
-                                                driver_route["start.id"])
-                expected_start = last_end_time[driver_route["driver.id"]] + timedelta(
-                    minutes=transfer_time + extra_time)
-                if start_time < expected_start:
-                    score -= penalty_per_time
-            last_end_time[driver_route["driver.id"]] = end_time
-            last_end_loc[driver_route["driver.id"]] = driver_route["end.id"]
-        return score
-
-    def crossover(parent1, parent2):
-        child = list({} for _ in routes_db)
-        i = 0
-        for _ in routes_db:
-            if random.random() > 0.5:
-                child[i] = parent1[i].copy()
-            else:
-                child[i] = parent2[i].copy()
-            i += 1
-        return child
-
-    def mutate(individual):
-        for _ in individual:
-            if random.random() < mutation_prob:
-                __ = random.choice(individual)
-                _["driver.id"],__["driver.id"]=__["driver.id"],_["driver.id"]
-                break
-        return individual
-
-    def evolve(population):
-        population.sort(key=lambda ind: grade(ind), reverse=True)
-        next_gen = population[:population_size//5]
-        while len(next_gen) < population_size:
-            p1 = random.choice(population[:population_size//4])
-            p2 = random.choice(population[:population_size//4])
-            child = crossover(p1, p2)
-            child = mutate(child)
-            next_gen.append(child)
-        return next_gen
-
-    population_size = 200
-    generations = 1000
-    mutation_prob = 0.1
-
-    population = [create_individual() for _ in range(population_size)]
-    for generation in range(generations):
-        population = evolve(population)
-
-    best_list = max(population, key=grade)
-
-    if grade(best_list) < -99:
-        raise ValueError("Ошибка генерации: вероятно, недостаточно водителей")
+def chromosome(drivers):
+    """
+    Хромосома особи: плоский массив индексов водителей по маршрутам
+    (в порядке instance.genes). Описание маршрутов не копируется в особь,
+    а берётся из общей таблицы instance.genes при декодировании (decode).
+    """
+    return array(GENE_TYPECODE, drivers)
+
+
+def create_individual(instance, rng=random):
+    n_drivers = instance.n_drivers
+    return chromosome([rng.randrange(n_drivers) for _ in range(instance.n_routes)])
+
+
+def grade(individual, instance, conflicts=None):
+    """
+    Штраф особи (0 - идеальное расписание).
+
+    individual - последовательность индексов водителей по маршрутам.
+    conflicts - таблица instance.conflict_rows(); её стоит подготовить
+    один раз на запуск, иначе она строится при каждом вызове.
+    """
+    if conflicts is None:
+        conflicts = instance.conflict_rows()
+    score = 0
+    ideal_per_driver = instance.n_routes / instance.n_drivers
+    driver_count = [0] * instance.n_drivers
+    for driver in individual:
+        driver_count[driver] += 1
+    for count in driver_count:
+        delta = abs(count - ideal_per_driver)
+        if not delta < 1:
+            score -= int(delta * PENALTY_PER_NUMBER)
+    last_route = [None] * instance.n_drivers
+    for i, driver in enumerate(individual):
+        previous = last_route[driver]
+        if previous is not None and conflicts[previous][i]:
+            score -= PENALTY_PER_TIME
+        last_route[driver] = i
+    return score
+
+
+def crossover(parent1, parent2, rng=random):
+    # Потомок - копия parent2 срезом, гены parent1 переносятся поверх.
+    child = parent2[:]
+    for i, driver in enumerate(parent1):
+        if rng.random() > 0.5:
+            child[i] = driver
+    return child
+
+
+def mutate(individual, mutation_prob=MUTATION_PROB, rng=random):
+    n_routes = len(individual)
+    for i in range(n_routes):
+        if rng.random() < mutation_prob:
+            j = rng.randrange(n_routes)
+            individual[i], individual[j] = individual[j], individual[i]
+            break
+    return individual
+
+
+def evolve(population, fitness, population_size=POPULATION_SIZE, mutation_prob=MUTATION_PROB,
+           rng=random):
+    population.sort(key=fitness, reverse=True)
+    next_gen = population[:population_size//5]
+    while len(next_gen) < population_size:
+        p1 = rng.choice(population[:population_size//4])
+        p2 = rng.choice(population[:population_size//4])
+        child = crossover(p1, p2, rng)
+        child = mutate(child, mutation_prob, rng)
+        next_gen.append(child)
+    return next_gen
+
+
+class PythonEngine:
+    """
+    Исходный движок: особь - хромосома (массив индексов водителей, chromosome()),
+    оценки кэшируются в FitnessCache.
+
+    Все движки устроены одинаково: populate() создаёт популяцию (при необходимости
+    из готовых векторов индексов водителей), step() выполняет одно поколение,
+    scores() и individual() дают оценки и особи текущей популяции,
+    replace() подменяет особь, counters() - счётчики оценок.
+    """
+
+    def __init__(self, instance, config):
+        self.instance = instance
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.cache = FitnessCache(config.fitness_cache_size)
+        self.population = []
+        conflicts = instance.conflict_rows()
+        self._grade_clock = 0.0
+        self.grade_seconds = 0.0
+
+        def timed_grade(individual):
+            started = time.perf_counter()
+            score = grade(individual, instance, conflicts)
+            self._grade_clock += time.perf_counter() - started
+            return score
+
+        self.fitness = self.cache.wrap(timed_grade, key=assignment_key)
+
+    def populate(self, seeds=()):
+        self.population = [chromosome(drivers) for drivers in seeds]
+        while len(self.population) < self.config.population_size:
+            self.population.append(create_individual(self.instance, self.rng))
 
+    def step(self):
+        graded = self._grade_clock
+        self.population = evolve(self.population, self.fitness, self.config.population_size,
+                                 self.config.mutation_prob, self.rng)
+        self.grade_seconds += self._grade_clock - graded
+
+    def scores(self):
+        return [self.fitness(individual) for individual in self.population]
+
+    def individual(self, k):
+        return self.population[k].tolist()
+
+    def replace(self, k, drivers):
+        self.population[k] = chromosome(drivers)
+
+    def counters(self):
+        # grade_seconds - время оценок внутри step(), остальное время step() -
+        # отбор, crossover и mutate
+        return {**self.cache.stats(), "grade_seconds": self.grade_seconds}
+
+
+def create_engine(instance, config):
+    if config.engine == "numpy":
+        from app.genetic.vectorized import NumpyEngine
+        return NumpyEngine(instance, config)
+    if config.engine == "delta":
+        from app.genetic.delta import DeltaEngine
+        return DeltaEngine(instance, config)
+    return PythonEngine(instance, config)
+
+
+def best_of(engine):
+    """Лучшая особь движка: (вектор индексов водителей, оценка)."""
+    scores = engine.scores()
+    k = max(range(len(scores)), key=scores.__getitem__)
+    return engine.individual(k), int(scores[k])
+
+
+def progress(generation, scores):
+    """Сводка поколения для callback в solve()."""
+    return {
+        "generation": generation,
+        "best_score": int(max(scores)),
+        "mean_score": float(sum(scores) / len(scores)),
+    }
+
+
+def decode(instance, drivers):
+    """Особь из вектора индексов водителей в виде списка генов."""
+    return [dict(gene, **{"driver.id": instance.driver_ids[d]})
+            for gene, d in zip(instance.genes, drivers)]
+
+
+def build_result(instance, best_list):
+    """Распределение маршрутов лучшей особи по водителям в формате ответа API."""
+    day_start = time_str_to_minutes("00:00")
     result = []
-    for _ in drivers_db:
+    for driver_id, driver_name in zip(instance.driver_ids, instance.driver_names):
         driver_result = {
-            "driver": _.name,
+            "driver": driver_name,
             "routes": []
         }
-        for __ in best_list:
-            if __["driver.id"] == _.id:
-                start_time = time_str_to_minutes(__["time"])
-                travel_duration = get_travel_time(__["start.id"], __["end.id"])
-                end_time = start_time + timedelta(minutes=travel_duration)
+        for i, __ in enumerate(best_list):
+            if __["driver.id"] == driver_id:
+                end_time = day_start + timedelta(minutes=float(instance.end[i]))
                 driver_result["routes"].append({
                     "route.id": __["route.id"],
                     "start": __["start"],
@@ -141,5 +313,161 @@ def run_genetic_algorithm(drivers_db, locations_db, time_matrix_db, routes_db):
                     "end_time": minutes_to_time_str(end_time),
                 })
         result.append(driver_result)
+    return result
+
+
+def solve(instance, config=None, callback=None, snapshot_every=None, **params):
+    """
+    Генерирует расписание для уже собранной задачи.
+
+    Параметры берутся из config (GAConfig), params переопределяют отдельные поля.
+    config.engine выбирает реализацию эволюции:
+        "python" - исходный алгоритм, особь - массив индексов водителей (chromosome);
+        "numpy" - векторизованный движок (app.genetic.vectorized), вся популяция
+        оценивается за один проход с той же функцией штрафов;
+        "delta" - инкрементальная оценка (app.genetic.delta): потомок, мало
+        отличающийся от родителя, пересчитывает только изменённые гены.
+    Оценки особей кэшируются (FitnessCache размером fitness_cache_size,
+    в остальных движках - переносом оценок элиты), поэтому элита и итоговый
+    выбор лучшей особи не пересчитываются.
+
+    callback(progress) вызывается после каждого поколения (в островной
+    модели - после каждой эпохи) со сводкой progress(); раз в snapshot_every
+    поколений в сводку добавляется текущее лучшее расписание ("schedule").
+    Если callback вернул True, эволюция останавливается досрочно; кроме того,
+    её останавливают критерии EarlyStop (время, застой, целевая оценка).
+
+    Если задан config.local_search_elites, лучшие особи каждого поколения
+    улучшаются локальным поиском (меметический алгоритм); config.polish
+    дополнительно доводит локальным поиском итоговую лучшую особь.
+    Локальный поиск не выходит за config.time_budget: если он уже истёк,
+    polish пропускается.
+
+    С config.warm_start эволюция начинается с предыдущего расписания:
+    сохранённые назначения остаются, новые маршруты вставляются жадно,
+    так что правка в течение дня обычно сводится к нескольким поколениям.
+    В статистику попадает число прежних маршрутов, сменивших водителя (changed_routes).
+
+    Если водителей заведомо не хватает для расписания без конфликтов,
+    ValueError бросается сразу, без запуска эволюции (config.presolve).
+
+    Статистика содержит "timings" - длительности этапов в секундах: presolve,
+    seeding, populate, evolve (у движка "python" - grade и breed: отбор,
+    crossover и mutate), local_search, polish и decode.
+
+    Возвращает (расписание, статистика запуска).
+    """
+    config = replace(config or GAConfig(), **params)
+    if config.engine not in ENGINES:
+        raise ValueError(f"Неизвестный движок: {config.engine}")
+    stop = EarlyStop(config)
+    timings = Timings()
+    min_drivers = None
+    if config.presolve:
+        from app.genetic.presolve import check_feasibility
+        with timings.span("presolve"):
+            min_drivers = check_feasibility(instance)
+
+    seeds = []
+    with timings.span("seeding"):
+        if config.warm_start:
+            from app.genetic.seeding import warm_population
+            seeds = warm_population(instance, config.warm_start,
+                                    max(1, int(config.population_size * config.warm_fraction)),
+                                    random.Random(config.seed))
+        if config.greedy_fraction > 0:
+            from app.genetic.seeding import greedy_population
+            seeds += greedy_population(instance,
+                                       int(config.population_size * config.greedy_fraction),
+                                       random.Random(config.seed))
+        seeds = seeds[:config.population_size]
+
+    if config.islands > 1:
+        from app.genetic.islands import evolve_islands
+        with timings.span("evolve"):
+            best_drivers, best_score, run = evolve_islands(instance, config, stop, callback,
+                                                           snapshot_every, seeds)
+    else:
+        engine = create_engine(instance, config)
+        with timings.span("populate"):
+            engine.populate(seeds)
+        search = None
+        if config.local_search_elites > 0:
+            from app.genetic.local_search import LocalSearch
+            search = LocalSearch(instance, deadline=stop.deadline)
+        done = 0
+        reason = "generations"
+        while done < config.generations:
+            with timings.span("evolve"):
+                engine.step()
+            if search is not None:
+                with timings.span("local_search"):
+                    search.improve_elites(engine, config.local_search_elites)
+            done += 1
+            if callback is None and not stop.active:
+                continue
+            scores = engine.scores()
+            if callback is not None:
+                summary = progress(done, scores)
+                if snapshot_every and done % snapshot_every == 0:
+                    summary["schedule"] = build_result(instance,
+                                                       decode(instance, best_of(engine)[0]))
+                if callback(summary):
+                    reason = "callback"
+                    break
+            reason = stop.check(max(scores)) or reason
+            if reason != "generations":
+                break
+        best_drivers, best_score = best_of(engine)
+        run = {"generations": done, "stop_reason": reason, **engine.counters()}
+        if search is not None:
+            run.update(search.counters())
+
+    grade_seconds = run.pop("grade_seconds", None)
+    if grade_seconds is not None and config.islands == 1 and "evolve" in timings.seconds:
+        # Движок "python" отдельно считает время оценок: evolve делится на grade и breed.
+        timings.add("grade", grade_seconds)
+        timings.seconds["breed"] = max(0.0, timings.seconds.pop("evolve") - grade_seconds)
+
+    if config.polish and (best_score == 0 or stop.expired()):
+        # Расписание без штрафов улучшать некуда, а после time_budget некогда;
+        # DeltaContext не строится.
+        run["polish_gain"] = 0
+    elif config.polish:
+        from app.genetic.local_search import LocalSearch
+        with timings.span("polish"):
+            polished, polished_score = LocalSearch(
+                instance, max_rounds=instance.n_routes,
+                deadline=stop.deadline).improve(best_drivers)
+        run["polish_gain"] = max(0, polished_score - best_score)
+        if polished_score > best_score:
+            best_drivers, best_score = polished, polished_score
+
+    if config.warm_start:
+        run["changed_routes"] = sum(
+            route_id in config.warm_start and
+            config.warm_start[route_id] != instance.driver_ids[driver]
+            for route_id, driver in zip(instance.route_ids, best_drivers))
+
+    if best_score < -99:
+        raise ValueError("Ошибка генерации: вероятно, недостаточно водителей")
+
+    with timings.span("decode"):
+        result = build_result(instance, decode(instance, best_drivers))
+    stats = {
+        "engine": config.engine,
+        "islands": config.islands,
+        "score": best_score,
+        "min_drivers": min_drivers,
+        "evaluations": run["cache_misses"],
+        "elapsed": round(time.monotonic() - stop.started, 3),
+        **run,
+        "timings": timings.rounded(),
+    }
+    return result, stats
+
 
+def run_genetic_algorithm(drivers_db, locations_db, time_matrix_db, routes_db, engine="python"):
+    instance = ProblemInstance(drivers_db, locations_db, time_matrix_db, routes_db)
+    result, stats = solve(instance, engine=engine)
     return result
@@ -0,0 +1,67 @@
+"""
+Кэш оценок особей: элита переходит между поколениями без изменений,
+поэтому её повторная оценка заменяется поиском по ключу
+"""
+from array import array
+from collections import OrderedDict
+from hashlib import blake2b
+
+FITNESS_CACHE_SIZE = 4096
+
+
+def assignment_key(drivers):
+    """
+    Компактный ключ вектора назначений (id или индексы водителей по маршрутам).
+    Принимает последовательность целых чисел или numpy-массив.
+    """
+    if hasattr(drivers, "tobytes"):
+        data = drivers.tobytes()
+    else:
+        data = array("q", drivers).tobytes()
+    return blake2b(data, digest_size=16).digest()
+
+
+class FitnessCache:
+    """
+    Ограниченный LRU-кэш оценок.
+
+    Атрибуты:
+        maxsize (int): Максимальное число хранимых оценок.
+        hits (int): Число найденных в кэше оценок.
+        misses (int): Число оценок, которые пришлось вычислить.
+    """
+
+    def __init__(self, maxsize=FITNESS_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._scores = OrderedDict()
+
+    def get(self, key):
+        score = self._scores.get(key)
+        if score is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._scores.move_to_end(key)
+        return score
+
+    def put(self, key, score):
+        self._scores[key] = score
+        self._scores.move_to_end(key)
+        if len(self._scores) > self.maxsize:
+            self._scores.popitem(last=False)
+
+    def wrap(self, fitness, key):
+        """Оборачивает функцию оценки: key(individual) строит ключ особи."""
+        def cached(individual):
+            k = key(individual)
+            score = self.get(k)
+            if score is None:
+                score = fitness(individual)
+                self.put(k, score)
+            return score
+        return cached
+
+    def stats(self):
+        return {"cache_hits": self.hits, "cache_misses": self.misses}
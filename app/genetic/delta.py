@@ -0,0 +1,287 @@
+"""
+Инкрементальная (дельта) оценка особей.
+
+Особь хранит состояние по водителям: цепочку маршрутов в порядке времени,
+число конфликтов в ней и текущую оценку. Переназначение маршрута меняет
+только цепочки двух водителей и только вокруг соседей маршрута, поэтому
+потомок, получивший от второго родителя немного отличающихся генов (так бывает,
+когда популяция сходится), пересчитывается за O(изменённых генов). Если
+отличий много, как в начале эволюции, особь оценивается заново одним проходом.
+Сравнение с движком "python": python -m benchmarks.delta.
+Случайные числа расходуются в том же порядке, что и в app.genetic.algorithm,
+поэтому при одинаковом seed результат совпадает с движком "python".
+"""
+import random
+from bisect import bisect_left
+
+from app.genetic.algorithm import (
+    PENALTY_PER_TIME, PENALTY_PER_NUMBER, MUTATION_PROB, POPULATION_SIZE, grade
+)
+
+# Если потомок получает от второго родителя больше 1/REBUILD_FACTOR маршрутов,
+# его состояние строится заново за один проход, а не переназначениями по одному.
+REBUILD_FACTOR = 8
+
+
+class DeltaContext:
+    """
+    Общие для всех особей данные задачи.
+
+    Атрибуты:
+        instance (ProblemInstance): Задача.
+        conflicts (list[memoryview]): Таблица конфликтов маршрутов (instance.conflict_rows()).
+        load_penalty (list[int]): Штраф за нагрузку водителя по числу его маршрутов.
+    """
+
+    def __init__(self, instance):
+        self.instance = instance
+        self.conflicts = instance.conflict_rows()
+        ideal_per_driver = instance.n_routes / instance.n_drivers
+        self.load_penalty = []
+        for count in range(instance.n_routes + 1):
+            delta = abs(count - ideal_per_driver)
+            self.load_penalty.append(0 if delta < 1 else int(delta * PENALTY_PER_NUMBER))
+
+
+class TrackedIndividual:
+    """
+    Особь с состоянием по водителям.
+
+    Состояние строится лениво: новая особь хранит только вектор водителей,
+    оценка считается одним проходом grade() при первом обращении к score,
+    а цепочки - только при первом переназначении маршрута. Так потомок,
+    собранный заново после скрещивания, стоит не дороже оценки в движке "python".
+
+    Атрибуты:
+        drivers (list[int]): Индекс водителя для каждого маршрута.
+        chains (list[list[int]]): Маршруты каждого водителя в порядке времени.
+        driver_conflicts (list[int]): Число конфликтов в цепочке каждого водителя.
+        score (int): Оценка, совпадающая с grade().
+    """
+    __slots__ = ("context", "drivers", "_chains", "_driver_conflicts", "_score", "_owned")
+
+    def __init__(self, context, drivers):
+        self.context = context
+        self.drivers = list(drivers)
+        self._chains = None
+        self._driver_conflicts = None
+        self._score = None
+        self._owned = None
+
+    def _build(self):
+        context = self.context
+        n_drivers = context.instance.n_drivers
+        chains = [[] for _ in range(n_drivers)]
+        driver_conflicts = [0] * n_drivers
+        conflicts = context.conflicts
+        # Один проход, как в grade(): конфликт с предыдущим маршрутом того же водителя.
+        for i, driver in enumerate(self.drivers):
+            chain = chains[driver]
+            if chain and conflicts[chain[-1]][i]:
+                driver_conflicts[driver] += 1
+            chain.append(i)
+        self._chains = chains
+        self._driver_conflicts = driver_conflicts
+        self._score = -(sum(context.load_penalty[len(chain)] for chain in chains) +
+                        PENALTY_PER_TIME * sum(driver_conflicts))
+        self._owned = set(range(n_drivers))
+
+    @property
+    def chains(self):
+        if self._chains is None:
+            self._build()
+        return self._chains
+
+    @property
+    def driver_conflicts(self):
+        if self._chains is None:
+            self._build()
+        return self._driver_conflicts
+
+    @property
+    def score(self):
+        if self._score is None:
+            self._score = grade(self.drivers, self.context.instance, self.context.conflicts)
+        return self._score
+
+    def derive(self):
+        """Копия особи; цепочки копируются только при первом изменении."""
+        if self._chains is None:
+            self._build()
+        child = TrackedIndividual.__new__(TrackedIndividual)
+        child.context = self.context
+        child.drivers = self.drivers[:]
+        child._chains = self._chains[:]
+        child._driver_conflicts = self._driver_conflicts[:]
+        child._score = self._score
+        child._owned = set()
+        return child
+
+    def _chain(self, driver):
+        if driver not in self._owned:
+            self._chains[driver] = self._chains[driver][:]
+            self._owned.add(driver)
+        return self._chains[driver]
+
+    def _between(self, prev, route, nxt):
+        # Конфликты, которые добавляет маршрут route между соседями prev и nxt.
+        conflicts = self.context.conflicts
+        delta = 0
+        if prev is not None:
+            delta += conflicts[prev][route]
+        if nxt is not None:
+            delta += conflicts[route][nxt]
+        if prev is not None and nxt is not None:
+            delta -= conflicts[prev][nxt]
+        return delta
+
+    def set_driver(self, i, driver):
+        old = self.drivers[i]
+        if old == driver:
+            return
+        if self._chains is None:
+            self._build()
+        load_penalty = self.context.load_penalty
+
+        chain = self._chain(old)
+        k = bisect_left(chain, i)
+        del chain[k]
+        removed = -self._between(chain[k - 1] if k > 0 else None, i,
+                                 chain[k] if k < len(chain) else None)
+        self._driver_conflicts[old] += removed
+        self._score += (load_penalty[len(chain) + 1] - load_penalty[len(chain)]
+                       - PENALTY_PER_TIME * removed)
+
+        chain = self._chain(driver)
+        k = bisect_left(chain, i)
+        added = self._between(chain[k - 1] if k > 0 else None, i,
+                              chain[k] if k < len(chain) else None)
+        chain.insert(k, i)
+        self._driver_conflicts[driver] += added
+        self._score -= (load_penalty[len(chain)] - load_penalty[len(chain) - 1]
+                       + PENALTY_PER_TIME * added)
+
+        self.drivers[i] = driver
+
+    def swap(self, i, j):
+        """Обмен водителей маршрутов i и j; без построенных цепочек - только пересчёт оценки."""
+        a, b = self.drivers[i], self.drivers[j]
+        if self._chains is None:
+            self.drivers[i], self.drivers[j] = b, a
+            if a != b:
+                self._score = None
+            return
+        self.set_driver(i, b)
+        self.set_driver(j, a)
+
+    def relocate_gain(self, i, driver):
+        """Изменение оценки, если отдать маршрут i водителю driver; особь не меняется."""
+        old = self.drivers[i]
+        if old == driver:
+            return 0
+        load_penalty = self.context.load_penalty
+
+        chain = self.chains[old]
+        k = bisect_left(chain, i)
+        removed = -self._between(chain[k - 1] if k > 0 else None, i,
+                                 chain[k + 1] if k + 1 < len(chain) else None)
+        load = load_penalty[len(chain) - 1] - load_penalty[len(chain)]
+
+        chain = self.chains[driver]
+        k = bisect_left(chain, i)
+        added = self._between(chain[k - 1] if k > 0 else None, i,
+                              chain[k] if k < len(chain) else None)
+        load += load_penalty[len(chain) + 1] - load_penalty[len(chain)]
+
+        return -(load + PENALTY_PER_TIME * (removed + added))
+
+    def swap_gain(self, i, j):
+        """Изменение оценки при обмене водителей маршрутов i и j; особь не меняется."""
+        a, b = self.drivers[i], self.drivers[j]
+        if a == b:
+            return 0
+        before = self.score
+        self.set_driver(i, b)
+        gain = self.score - before + self.relocate_gain(j, a)
+        self.set_driver(i, a)
+        return gain
+
+
+def create_tracked(context, rng=random):
+    n_drivers = context.instance.n_drivers
+    return TrackedIndividual(context, [rng.randrange(n_drivers)
+                                       for _ in range(context.instance.n_routes)])
+
+
+def crossover_tracked(parent1, parent2, rng=random):
+    drivers1, drivers2 = parent1.drivers, parent2.drivers
+    # rng.random() вызывается для каждого гена, как в crossover().
+    changed = [i for i in range(len(drivers1))
+               if not rng.random() > 0.5 and drivers1[i] != drivers2[i]]
+    if len(changed) * REBUILD_FACTOR > len(drivers1):
+        drivers = drivers1[:]
+        for i in changed:
+            drivers[i] = drivers2[i]
+        return TrackedIndividual(parent1.context, drivers)
+    child = parent1.derive()
+    for i in changed:
+        child.set_driver(i, drivers2[i])
+    return child
+
+
+def mutate_tracked(individual, mutation_prob=MUTATION_PROB, rng=random):
+    n_routes = len(individual.drivers)
+    for i in range(n_routes):
+        if rng.random() < mutation_prob:
+            individual.swap(i, rng.randrange(n_routes))
+            break
+    return individual
+
+
+def evolve_tracked(population, population_size=POPULATION_SIZE, mutation_prob=MUTATION_PROB,
+                   rng=random):
+    population.sort(key=lambda ind: ind.score, reverse=True)
+    next_gen = population[:population_size//5]
+    while len(next_gen) < population_size:
+        p1 = rng.choice(population[:population_size//4])
+        p2 = rng.choice(population[:population_size//4])
+        child = crossover_tracked(p1, p2, rng)
+        child = mutate_tracked(child, mutation_prob, rng)
+        next_gen.append(child)
+    return next_gen
+
+
+class DeltaEngine:
+    """Движок на TrackedIndividual, интерфейс как у PythonEngine."""
+
+    def __init__(self, instance, config):
+        self.config = config
+        self.context = DeltaContext(instance)
+        self.rng = random.Random(config.seed)
+        self.population = []
+        self._counters = {"cache_hits": 0, "cache_misses": 0}
+
+    def populate(self, seeds=()):
+        self.population = [TrackedIndividual(self.context, drivers) for drivers in seeds]
+        while len(self.population) < self.config.population_size:
+            self.population.append(create_tracked(self.context, self.rng))
+        self._counters["cache_misses"] += len(self.population)
+
+    def step(self):
+        size = self.config.population_size
+        self.population = evolve_tracked(self.population, size, self.config.mutation_prob, self.rng)
+        self._counters["cache_hits"] += size // 5
+        self._counters["cache_misses"] += size - size // 5
+
+    def scores(self):
+        return [individual.score for individual in self.population]
+
+    def individual(self, k):
+        return list(self.population[k].drivers)
+
+    def replace(self, k, drivers):
+        self.population[k] = TrackedIndividual(self.context, drivers)
+        self._counters["cache_misses"] += 1
+
+    def counters(self):
+        return dict(self._counters)
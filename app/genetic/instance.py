@@ -0,0 +1,113 @@
+"""
+Скомпилированная задача для генетического алгоритма: время, длительности
+и переезды разбираются один раз за запуск, а не при каждой оценке особи
+"""
+from datetime import datetime
+
+import numpy as np
+
+EXTRA_TIME = 10
+DEFAULT_TRAVEL_TIME = 30
+CONFLICTS_CHUNK = 1024
+
+
+def parse_minutes(t):
+    moment = datetime.strptime(t, "%H:%M")
+    return moment.hour * 60 + moment.minute
+
+
+class ProblemInstance:
+    """
+    Задача распределения маршрутов, собранная из данных пользователя.
+    Маршруты упорядочены по времени отправления, индекс маршрута
+    совпадает с позицией гена в особи.
+
+    Атрибуты:
+        driver_ids (list[int]): Идентификаторы водителей.
+        driver_names (list[str]): Имена водителей.
+        genes (list[dict]): Шаблон особи - маршруты без назначенного водителя.
+        route_ids (list[int]): Идентификаторы маршрутов.
+        start (np.ndarray): Время отправления в минутах от начала суток.
+        duration (np.ndarray): Длительность маршрута в минутах.
+        end (np.ndarray): Время прибытия в минутах.
+        locations (list[int]): Идентификаторы локаций, встречающихся в маршрутах.
+        start_loc (np.ndarray): Индекс стартовой локации маршрута в locations.
+        end_loc (np.ndarray): Индекс конечной локации маршрута в locations.
+        travel (np.ndarray): Плотная матрица времени переезда между локациями.
+        conflicts (np.ndarray): conflicts[i, j] истинно, если после маршрута i
+            водитель не успевает к маршруту j (переезд + EXTRA_TIME).
+    """
+
+    def __init__(self, drivers_db, locations_db, time_matrix_db, routes_db):
+        if not drivers_db or not locations_db or not time_matrix_db or not routes_db:
+            raise ValueError("Недостающие данные для расчета")
+
+        self.driver_ids = [driver.id for driver in drivers_db]
+        self.driver_names = [driver.name for driver in drivers_db]
+
+        time_matrix = {}
+        for tm in time_matrix_db:
+            time_matrix[(tm.from_location_id, tm.to_location_id)] = tm.travel_time
+
+        # Названия берутся из locations_db, а не через route.start_location:
+        # маршруты могут быть простыми кортежами без связей ORM.
+        names = {location.id: location.name for location in locations_db}
+        minutes = {route.id: parse_minutes(route.time) for route in routes_db}
+        routes = sorted(routes_db, key=lambda r: minutes[r.id])
+        self.genes = [{
+            "route.id": route.id,
+            "start": names.get(route.start_location_id),
+            "end": names.get(route.end_location_id),
+            "time": route.time,
+            "start.id": route.start_location_id,
+            "end.id": route.end_location_id,
+            "driver.id": None
+        } for route in routes]
+        self.route_ids = [route.id for route in routes]
+
+        self.locations = sorted({r.start_location_id for r in routes} |
+                                {r.end_location_id for r in routes})
+        index = {loc: i for i, loc in enumerate(self.locations)}
+        self.travel = np.full((len(self.locations), len(self.locations)),
+                              DEFAULT_TRAVEL_TIME, dtype=float)
+        np.fill_diagonal(self.travel, 0)
+        for (a, b), travel_time in time_matrix.items():
+            # Пара хранится как sorted([a, b]), время в пути симметрично.
+            if a < b and a in index and b in index:
+                self.travel[index[a], index[b]] = travel_time
+                self.travel[index[b], index[a]] = travel_time
+
+        self.start_loc = np.array([index[r.start_location_id] for r in routes])
+        self.end_loc = np.array([index[r.end_location_id] for r in routes])
+        self.start = np.array([minutes[r.id] for r in routes], dtype=np.int64)
+        self.duration = self.travel[self.start_loc, self.end_loc]
+        self.end = self.start + self.duration
+        self.conflicts = self._build_conflicts()
+
+    @property
+    def n_routes(self):
+        return len(self.route_ids)
+
+    @property
+    def n_drivers(self):
+        return len(self.driver_ids)
+
+    def conflict_rows(self):
+        """
+        Таблица conflicts построчно для поэлементного доступа из Python:
+        conflict_rows()[i][j] - 0 или 1. Строки - срезы memoryview над тем же
+        массивом, без копирования (в отличие от conflicts.tolist(), где каждая
+        ячейка - указатель на bool в списке списков).
+        """
+        view = memoryview(np.ascontiguousarray(self.conflicts)).cast("B")
+        n = self.n_routes
+        return [view[i * n:(i + 1) * n] for i in range(n)]
+
+    def _build_conflicts(self):
+        # Строки считаются блоками, чтобы промежуточные матрицы не росли как R×R.
+        conflicts = np.empty((self.n_routes, self.n_routes), dtype=bool)
+        for lo in range(0, self.n_routes, CONFLICTS_CHUNK):
+            hi = lo + CONFLICTS_CHUNK
+            transfer = self.travel[self.end_loc[lo:hi, None], self.start_loc[None, :]]
+            conflicts[lo:hi] = self.start[None, :] < self.end[lo:hi, None] + transfer + EXTRA_TIME
+        return conflicts
@@ -0,0 +1,177 @@
+"""
+Островная модель: несколько популяций эволюционируют параллельно
+в пуле процессов и периодически обмениваются лучшими особями.
+
+Пул процессов один на процесс сервера (не больше os.cpu_count() процессов)
+и создаётся лениво методом spawn: fork из многопоточного сервера мог бы
+унаследовать захваченную другим потоком блокировку и зависнуть. Поэтому
+скрипт, запускающий острова, должен делать это под if __name__ == "__main__".
+"""
+import multiprocessing
+import os
+import pickle
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import replace
+
+from app.genetic.algorithm import build_result, create_engine, decode, progress
+from app.genetic.local_search import LocalSearch
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Задача, загруженная в процесс пула последней, и её ключ
+_instance = None
+_instance_key = None
+
+
+def get_pool():
+    """Общий пул процессов островов."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool(pool):
+    # Упавший процесс ломает весь пул: следующий запуск создаст новый.
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _load_instance(key, payload):
+    # Задача распаковывается один раз на процесс, пока не придёт другая.
+    global _instance, _instance_key
+    if key != _instance_key:
+        _instance = pickle.loads(payload)
+        _instance_key = key
+    return _instance
+
+
+def _evolve_island(key, payload, config, population, generations, deadline=None):
+    """
+    Эволюция одного острова на протяжении эпохи; эпоха обрывается,
+    как только time.monotonic() достигло deadline. Задача приходит
+    как payload (pickle) с ключом key запуска.
+    Возвращает особи (векторы индексов водителей) и их оценки
+    от лучшей к худшей, счётчики оценок и число выполненных поколений.
+    """
+    instance = _load_instance(key, payload)
+    engine = create_engine(instance, config)
+    engine.populate(population)
+    search = (LocalSearch(instance, deadline=deadline)
+              if config.local_search_elites > 0 else None)
+    done = 0
+    while done < generations:
+        engine.step()
+        if search is not None:
+            search.improve_elites(engine, config.local_search_elites)
+        done += 1
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+    scores = engine.scores()
+    order = sorted(range(len(scores)), key=lambda k: -scores[k])
+    counters = engine.counters()
+    if search is not None:
+        counters.update(search.counters())
+    return ([engine.individual(k) for k in order],
+            [int(scores[k]) for k in order],
+            counters,
+            done)
+
+
+def migrate(populations, migrants):
+    """Кольцевая миграция: лучшие особи острова заменяют худших у следующего."""
+    if migrants <= 0:
+        return populations
+    migrated = []
+    for k, population in enumerate(populations):
+        neighbour = populations[k - 1]
+        migrated.append(population[:-migrants] + [list(d) for d in neighbour[:migrants]])
+    return migrated
+
+
+def best_island(results):
+    best = max(range(len(results)), key=lambda k: results[k][1][0])
+    population, scores = results[best][:2]
+    return population[0], scores[0]
+
+
+def evolve_islands(instance, config, stop, callback=None, snapshot_every=None, seeds=()):
+    """
+    Запуск config.islands островов по config.population_size особей.
+    Каждые config.migration_interval поколений config.migrants лучших особей
+    каждого острова переходят к соседу по кольцу. Готовые особи seeds
+    попадают в начальную популяцию каждого острова.
+
+    Одновременно выполняется не больше config.workers островов запуска (по умолчанию
+    все), а всего в пуле - не больше os.cpu_count(). Зёрна островов на каждую эпоху
+    выдаёт генератор с config.seed в главном процессе, поэтому при фиксированном
+    seed результат не зависит от числа процессов и порядка их завершения.
+    callback(progress) вызывается после каждой эпохи по всем островам сразу,
+    как и в solve(): со снимком расписания раз в snapshot_every поколений
+    и досрочной остановкой, если callback вернул True. Критерии stop (EarlyStop)
+    проверяются на границах эпох, а stop.deadline - ещё и каждым островом после
+    каждого поколения, так что time_budget не превышается на длину эпохи.
+
+    Возвращает (вектор индексов водителей, оценка) лучшей особи и сводку запуска:
+    число поколений, причину остановки и счётчики оценок.
+    """
+    master = random.Random(config.seed)
+    workers = config.workers or config.islands
+    interval = max(1, config.migration_interval)
+    populations = [list(seeds) for _ in range(config.islands)]
+    counters = {"cache_hits": 0, "cache_misses": 0}
+    results = []
+    reason = "generations"
+    key = uuid.uuid4().hex
+    payload = pickle.dumps(instance, protocol=pickle.HIGHEST_PROTOCOL)
+    pool = get_pool()
+
+    try:
+        done = 0
+        while done < config.generations or not results:
+            span = min(interval, config.generations - done)
+            tasks = [(replace(config, seed=master.getrandbits(63)), population)
+                     for population in populations]
+            results = []
+            for start in range(0, len(tasks), workers):
+                futures = [pool.submit(_evolve_island, key, payload, island_config,
+                                       population, span, stop.deadline)
+                           for island_config, population in tasks[start:start + workers]]
+                results += [future.result() for future in futures]
+            for _, _, island_counters, _ in results:
+                for name, value in island_counters.items():
+                    counters[name] = counters.get(name, 0) + value
+            previous = done
+            span = max(generations for _, _, _, generations in results)
+            done += span
+            populations = migrate([population for population, _, _, _ in results],
+                                  config.migrants)
+            if callback is not None:
+                summary = progress(done, [score for _, scores, _, _ in results
+                                          for score in scores])
+                if snapshot_every and done // snapshot_every > previous // snapshot_every:
+                    best_drivers, _ = best_island(results)
+                    summary["schedule"] = build_result(instance, decode(instance, best_drivers))
+                if callback(summary):
+                    reason = "callback"
+                    break
+            reason = stop.check(best_island(results)[1], span) or reason
+            if reason != "generations":
+                break
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        raise
+
+    best_drivers, best_score = best_island(results)
+    return best_drivers, best_score, {"generations": done, "stop_reason": reason, **counters}
@@ -0,0 +1,114 @@
+"""
+Локальный поиск (меметическая фаза): улучшение особей ходами
+"переназначить маршрут" и "обменять водителей двух маршрутов"
+с инкрементальной оценкой через TrackedIndividual
+"""
+import time
+
+from app.genetic.delta import DeltaContext, TrackedIndividual
+
+MAX_ROUNDS = 20
+SWAP_WINDOW = 10
+
+
+class LocalSearch:
+    """
+    Локальный поиск с выбором лучшего улучшающего хода на каждом шаге.
+
+    Ходы рассматриваются только для "проблемных" маршрутов: участвующих
+    в конфликте по времени или принадлежащих перегруженному водителю.
+    Переназначение проверяется на всех водителей (для маршрутов перегруженного
+    водителя - только на недогруженных), обмен - с маршрутами в пределах
+    SWAP_WINDOW соседей по времени.
+
+    С deadline (момент time.monotonic(), обычно EarlyStop.deadline) новые
+    раунды и особи не начинаются после его наступления.
+
+    Атрибуты:
+        evaluated (int): Число оценённых ходов.
+        applied (int): Число применённых ходов.
+    """
+
+    def __init__(self, instance, max_rounds=MAX_ROUNDS, window=SWAP_WINDOW, deadline=None):
+        self.context = DeltaContext(instance)
+        self.max_rounds = max_rounds
+        self.window = window
+        self.deadline = deadline
+        self.evaluated = 0
+        self.applied = 0
+
+    def _hot_routes(self, individual):
+        conflicts = self.context.conflicts
+        load_penalty = self.context.load_penalty
+        ideal_per_driver = self.context.instance.n_routes / self.context.instance.n_drivers
+        conflicted, overloaded = set(), set()
+        for chain in individual.chains:
+            if load_penalty[len(chain)] > 0 and len(chain) > ideal_per_driver:
+                overloaded.update(chain)
+            for a, b in zip(chain, chain[1:]):
+                if conflicts[a][b]:
+                    conflicted.add(a)
+                    conflicted.add(b)
+        return sorted(conflicted), sorted(overloaded - conflicted)
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def _best_move(self, individual):
+        n_routes = len(individual.drivers)
+        n_drivers = len(individual.chains)
+        ideal_per_driver = n_routes / n_drivers
+        underloaded = [d for d, chain in enumerate(individual.chains)
+                       if len(chain) < ideal_per_driver]
+        conflicted, overloaded = self._hot_routes(individual)
+
+        best_gain, best_move = 0, None
+        for routes, targets in ((conflicted, range(n_drivers)), (overloaded, underloaded)):
+            for i in routes:
+                for driver in targets:
+                    gain = individual.relocate_gain(i, driver)
+                    self.evaluated += 1
+                    if gain > best_gain:
+                        best_gain, best_move = gain, ("relocate", i, driver)
+        for i in conflicted:
+            for j in range(max(0, i - self.window), min(n_routes, i + self.window + 1)):
+                if individual.drivers[i] == individual.drivers[j]:
+                    continue
+                gain = individual.swap_gain(i, j)
+                self.evaluated += 1
+                if gain > best_gain:
+                    best_gain, best_move = gain, ("swap", i, j)
+        return best_move
+
+    def improve(self, drivers):
+        """Улучшает особь (вектор индексов водителей); возвращает (вектор, оценка)."""
+        individual = TrackedIndividual(self.context, drivers)
+        for _ in range(self.max_rounds):
+            if individual.score == 0 or self.expired():
+                break
+            move = self._best_move(individual)
+            if move is None:
+                break
+            kind, i, x = move
+            if kind == "relocate":
+                individual.set_driver(i, x)
+            else:
+                a, b = individual.drivers[i], individual.drivers[x]
+                individual.set_driver(i, b)
+                individual.set_driver(x, a)
+            self.applied += 1
+        return individual.drivers, individual.score
+
+    def improve_elites(self, engine, count):
+        """Улучшает count лучших особей популяции движка на месте."""
+        scores = engine.scores()
+        elites = sorted(range(len(scores)), key=lambda k: -scores[k])[:count]
+        for k in elites:
+            if self.expired():
+                break
+            drivers, score = self.improve(engine.individual(k))
+            if score > scores[k]:
+                engine.replace(k, drivers)
+
+    def counters(self):
+        return {"local_search_evaluated": self.evaluated, "local_search_applied": self.applied}
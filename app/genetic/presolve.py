@@ -0,0 +1,144 @@
+"""
+Проверка выполнимости до запуска генетического алгоритма: минимальное число
+водителей, при котором маршруты можно распределить без конфликтов по времени
+"""
+from array import array
+
+import numpy as np
+
+from app.genetic.instance import EXTRA_TIME
+
+# Точное число водителей (паросочетание) считается только для задач не больше
+# этого числа маршрутов: граф цепочек содержит до R²/2 рёбер.
+PRESOLVE_EXACT_LIMIT = 1000
+
+
+def peak_overlap(instance):
+    """
+    Нижняя граница числа водителей: наибольшее число маршрутов, одновременно
+    занятых в интервале [start, end + EXTRA_TIME). Такие маршруты попарно
+    конфликтуют, поэтому у каждого из них должен быть свой водитель.
+    """
+    events = sorted([(start, 1) for start in instance.start.tolist()] +
+                    [(end + EXTRA_TIME, -1) for end in instance.end.tolist()],
+                    key=lambda event: (event[0], event[1]))
+    peak = active = 0
+    for _, change in events:
+        active += change
+        peak = max(peak, active)
+    return peak
+
+
+def chain_graph(instance):
+    """
+    Маршруты, которые водитель успевает выполнить после каждого маршрута.
+    Списки хранятся как array("i") - 4 байта на ребро вместо объекта int.
+    """
+    adjacency = []
+    for i in range(instance.n_routes):
+        row = array("i")
+        row.frombytes((np.flatnonzero(~instance.conflicts[i, i + 1:]) + i + 1)
+                      .astype(np.int32).tobytes())
+        adjacency.append(row)
+    return adjacency
+
+
+def max_matching(adjacency, n):
+    """Наибольшее паросочетание в двудольном графе (алгоритм Хопкрофта-Карпа)."""
+    match_left = [-1] * n
+    match_right = [-1] * n
+    size = 0
+    # Жадное начальное паросочетание: ближайший по времени следующий маршрут.
+    for u in range(n):
+        for v in adjacency[u]:
+            if match_right[v] == -1:
+                match_left[u] = v
+                match_right[v] = u
+                size += 1
+                break
+
+    while True:
+        dist = [-1] * n
+        queue = [u for u in range(n) if match_left[u] == -1]
+        for u in queue:
+            dist[u] = 0
+        found = False
+        head = 0
+        while head < len(queue):
+            u = queue[head]
+            head += 1
+            for v in adjacency[u]:
+                w = match_right[v]
+                if w == -1:
+                    found = True
+                elif dist[w] == -1:
+                    dist[w] = dist[u] + 1
+                    queue.append(w)
+        if not found:
+            return size
+
+        pointer = [0] * n
+        for root in range(n):
+            if match_left[root] == -1 and _augment(root, adjacency, match_left, match_right,
+                                                   dist, pointer):
+                size += 1
+
+
+def _augment(root, adjacency, match_left, match_right, dist, pointer):
+    # Итеративный поиск увеличивающего пути по слоям dist.
+    stack = [root]
+    via = []
+    while stack:
+        u = stack[-1]
+        edges = adjacency[u]
+        advanced = False
+        while pointer[u] < len(edges):
+            v = edges[pointer[u]]
+            pointer[u] += 1
+            w = match_right[v]
+            if w == -1:
+                via.append(v)
+                for left, right in zip(stack, via):
+                    match_left[left] = right
+                    match_right[right] = left
+                return True
+            if dist[w] == dist[u] + 1:
+                stack.append(w)
+                via.append(v)
+                advanced = True
+                break
+        if not advanced:
+            dist[u] = -1
+            stack.pop()
+            if via:
+                via.pop()
+    return False
+
+
+def min_drivers(instance):
+    """
+    Минимальное число водителей без конфликтов по времени: наименьшее покрытие
+    маршрутов цепочками равно числу маршрутов минус наибольшее паросочетание
+    в графе "после маршрута i водитель успевает на маршрут j".
+    """
+    return instance.n_routes - max_matching(chain_graph(instance), instance.n_routes)
+
+
+def check_feasibility(instance):
+    """
+    Бросает ValueError, если водителей меньше, чем нужно для расписания
+    без конфликтов; иначе возвращает минимально необходимое их число.
+
+    Сначала считается дешёвая нижняя граница peak_overlap (O(R log R)).
+    Точный min_drivers считается, только если граница не решает вопрос
+    (водителей не меньше границы, но меньше числа маршрутов) и маршрутов
+    не больше PRESOLVE_EXACT_LIMIT; иначе возвращается нижняя граница.
+    """
+    available = instance.n_drivers
+    needed = peak_overlap(instance)
+    if needed <= available < instance.n_routes and instance.n_routes <= PRESOLVE_EXACT_LIMIT:
+        needed = min_drivers(instance)
+    if needed > available:
+        raise ValueError(f"Недостаточно водителей: требуется не меньше {needed}, "
+                         f"доступно {available}, не хватает {needed - available}")
+    return needed
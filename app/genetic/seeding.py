@@ -0,0 +1,90 @@
+"""
+Начальная популяция: конструктивная эвристика (маршруты по времени
+раздаются наименее загруженным водителям, которые успевают на маршрут)
+и тёплый старт из предыдущего расписания
+"""
+import random
+from bisect import bisect_left, insort
+
+
+def greedy_individual(instance, rng=random, conflicts=None):
+    """
+    Особь (вектор индексов водителей), построенная жадно: маршрут получает
+    водитель с наименьшей нагрузкой среди успевающих на него, при равенстве -
+    раньше всех освободившийся. Если не успевает никто, маршрут достаётся
+    наименее загруженному водителю. Порядок водителей перемешивается rng,
+    поэтому разные вызовы дают разные особи.
+    """
+    if conflicts is None:
+        conflicts = instance.conflict_rows()
+    end = instance.end.tolist()
+    order = list(range(instance.n_drivers))
+    rng.shuffle(order)
+    last = [None] * instance.n_drivers
+    load = [0] * instance.n_drivers
+
+    def free_since(d):
+        return float("-inf") if last[d] is None else end[last[d]]
+
+    drivers = []
+    for i in range(instance.n_routes):
+        free = [d for d in order if last[d] is None or not conflicts[last[d]][i]]
+        driver = min(free or order, key=lambda d: (load[d], free_since(d)))
+        drivers.append(driver)
+        last[driver] = i
+        load[driver] += 1
+    return drivers
+
+
+def greedy_population(instance, size, rng=random):
+    conflicts = instance.conflict_rows()
+    return [greedy_individual(instance, rng, conflicts) for _ in range(size)]
+
+
+def warm_individual(instance, previous, conflicts=None):
+    """
+    Особь из предыдущего расписания previous (route_id -> driver_id).
+    Маршруты, которых в нём нет (или чьих водителей больше нет), вставляются
+    в цепочку водителя, где добавляют меньше всего конфликтов, при равенстве -
+    к наименее загруженному; остальные маршруты сохраняют своих водителей.
+    """
+    if conflicts is None:
+        conflicts = instance.conflict_rows()
+    index = {driver_id: k for k, driver_id in enumerate(instance.driver_ids)}
+    drivers = [index.get(previous.get(route_id)) for route_id in instance.route_ids]
+    chains = [[] for _ in range(instance.n_drivers)]
+    for i, driver in enumerate(drivers):
+        if driver is not None:
+            chains[driver].append(i)
+
+    def added_conflicts(chain, i):
+        k = bisect_left(chain, i)
+        prev = chain[k - 1] if k > 0 else None
+        nxt = chain[k] if k < len(chain) else None
+        return ((prev is not None and conflicts[prev][i]) +
+                (nxt is not None and conflicts[i][nxt]) -
+                (prev is not None and nxt is not None and conflicts[prev][nxt]))
+
+    for i, driver in enumerate(drivers):
+        if driver is None:
+            driver = min(range(instance.n_drivers),
+                         key=lambda d: (added_conflicts(chains[d], i), len(chains[d])))
+            insort(chains[driver], i)
+            drivers[i] = driver
+    return drivers
+
+
+def warm_population(instance, previous, size, rng=random):
+    """
+    Предыдущее расписание и size - 1 его копий с одним-тремя
+    случайными обменами водителей между маршрутами.
+    """
+    base = warm_individual(instance, previous)
+    population = [base]
+    while len(population) < size:
+        drivers = base[:]
+        for _ in range(rng.randint(1, 3)):
+            i, j = rng.randrange(instance.n_routes), rng.randrange(instance.n_routes)
+            drivers[i], drivers[j] = drivers[j], drivers[i]
+        population.append(drivers)
+    return population
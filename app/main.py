@@ -1,13 +1,18 @@
 """
 Основной файл, через который происходит запуск приложения
 """
-from fastapi import FastAPI
-from app.db.database import engine, Base
+import time
+from fastapi import FastAPI, Request
+from app.db.database import engine
+from app.db.migrations import upgrade
 from app.crud.auth import router as auth_router
 from app.crud.crud import router as crud_router
 from app.crud.schedule import router as schedule_router
+from app.crud.jobs import router as jobs_router
+from app.crud.metrics import router as metrics_router
+from app.metrics import metrics
 
-Base.metadata.create_all(bind=engine)
+upgrade(engine)
 
 app = FastAPI(title="RouteCreator",
     description="Система для генерации и хранения расписания, основанная на генетическом алгоритме"
@@ -17,3 +22,19 @@ app = FastAPI(title="RouteCreator",
 app.include_router(auth_router)
 app.include_router(crud_router)
 app.include_router(schedule_router)
+app.include_router(jobs_router)
+app.include_router(metrics_router)
+
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    # Метка path - шаблон маршрута (/drivers/{driver_id}), а не конкретный адрес,
+    # чтобы число временных рядов не росло с числом id.
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    labels = {"method": request.method,
+              "path": route.path if route is not None else "unmatched"}
+    metrics.observe("http_request_seconds", time.perf_counter() - started, **labels)
+    metrics.inc("http_requests_total", status=response.status_code, **labels)
+    return response
@@ -0,0 +1,211 @@
+"""
+Метрики и профилирование: длительности этапов (Timings), счётчики и
+гистограммы процесса в текстовом формате Prometheus (metrics) и
+cProfile-профиль отдельного запроса для пользователей из PROFILE_USERS (profiled)
+"""
+import cProfile
+import glob
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Каталог для профилей cProfile; пока не задан, профилирование запросов выключено.
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+# Пользователи (через запятую), которым разрешено запрашивать профиль
+PROFILE_USERS = {name.strip() for name in os.getenv("PROFILE_USERS", "").split(",")
+                 if name.strip()}
+# Сколько последних файлов профилей хранится в PROFILE_DIR
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+# Границы корзин гистограмм длительностей, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Одновременно активен только один профилировщик на процесс.
+_profile_lock = threading.Lock()
+
+
+class Timings:
+    """Суммарные длительности именованных этапов одного запуска, секунды."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    def add(self, name: str, seconds: float):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    @contextmanager
+    def span(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def rounded(self) -> dict:
+        return {name: round(seconds, 4) for name, seconds in self.seconds.items()}
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format(name: str, labels: tuple, extra=()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return name
+    escaped = ((key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+               for key, value in pairs)
+    return name + "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class Metrics:
+    """
+    Потокобезопасный реестр метрик процесса.
+
+    inc() увеличивает счётчик, observe() добавляет длительность в гистограмму,
+    set() задаёт текущее значение (gauge); у каждой метрики могут быть метки.
+    render() выдаёт всё в текстовом формате Prometheus.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    def inc(self, name: str, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value, **labels):
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(BUCKETS), 0, 0.0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += 1
+            histogram[2] += seconds
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Длительность блока with в гистограмме name."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted((key, (list(h[0]), h[1], h[2]))
+                                for key, h in self._histograms.items())
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{_format(name, labels)} {value}")
+        for (name, labels), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{_format(name, labels)} {value}")
+        for (name, labels), (buckets, count, total) in histograms:
+            header(name, "histogram")
+            for bound, bucket in zip(BUCKETS, buckets):
+                lines.append(f"{_format(name + '_bucket', labels, [('le', bound)])} {bucket}")
+            lines.append(f"{_format(name + '_bucket', labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{_format(name + '_count', labels)} {count}")
+            lines.append(f"{_format(name + '_sum', labels)} {round(total, 6)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.describe("http_requests_total", "Число обработанных HTTP-запросов")
+metrics.describe("http_request_seconds", "Длительность HTTP-запросов")
+metrics.describe("schedule_stage_seconds", "Длительность этапов генерации расписания")
+metrics.describe("ga_stage_seconds", "Длительность этапов генетического алгоритма")
+metrics.describe("ga_runs_total", "Число запусков генетического алгоритма")
+metrics.describe("ga_generations_total", "Число выполненных поколений")
+metrics.describe("ga_evaluations_total", "Число вычисленных оценок особей")
+metrics.describe("ga_cache_hits_total", "Число оценок, найденных в кэше оценок")
+metrics.describe("result_cache_requests_total", "Обращения к кэшу результатов")
+metrics.describe("result_cache_entries", "Результатов в памяти кэша результатов")
+metrics.describe("token_cache_entries", "Проверенных токенов в кэше")
+
+
+def record_solve(stats: dict):
+    """Переносит статистику запуска solve() в счётчики и гистограммы metrics."""
+    engine = stats["engine"]
+    metrics.inc("ga_runs_total", engine=engine, stop_reason=stats.get("stop_reason"))
+    metrics.inc("ga_generations_total", stats.get("generations", 0), engine=engine)
+    metrics.inc("ga_evaluations_total", stats.get("evaluations", 0), engine=engine)
+    metrics.inc("ga_cache_hits_total", stats.get("cache_hits", 0), engine=engine)
+    for stage, seconds in stats.get("timings", {}).items():
+        metrics.observe("ga_stage_seconds", seconds, engine=engine, stage=stage)
+
+
+def profiling_allowed(username: str) -> bool:
+    """Можно ли профилировать запросы пользователя username."""
+    return bool(PROFILE_DIR) and username in PROFILE_USERS
+
+
+def _remove_old_profiles():
+    paths = sorted(glob.glob(os.path.join(PROFILE_DIR, "*.prof")),
+                   key=lambda path: (os.path.getmtime(path), path))
+    for path in paths[:max(0, len(paths) - PROFILE_KEEP)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@contextmanager
+def profiled(name: str, enabled: bool):
+    """
+    Профилирует блок with через cProfile, если профиль запрошен (enabled)
+    и задан PROFILE_DIR. Возвращает словарь, в котором после выхода из блока
+    "file" - имя файла профиля в PROFILE_DIR (для pstats или snakeviz) или None.
+    В PROFILE_DIR остаются только PROFILE_KEEP последних профилей.
+
+    Профилируется только текущий поток: работа островов в других
+    процессах в профиль не попадает. Если профиль уже снимается для
+    другого запроса, блок выполняется без профилирования.
+    """
+    dump = {"file": None}
+    if not enabled or not PROFILE_DIR or not _profile_lock.acquire(blocking=False):
+        yield dump
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+        try:
+            yield dump
+        finally:
+            profile.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            dump["file"] = f"{name}-{time.time_ns()}.prof"
+            profile.dump_stats(os.path.join(PROFILE_DIR, dump["file"]))
+            _remove_old_profiles()
+    finally:
+        _profile_lock.release()
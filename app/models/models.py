@@ -1,7 +1,7 @@
 """
 Создаём шаблоны таблиц в БД
 """
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from passlib.context import CryptContext
 from app.db.database import Base
@@ -17,6 +17,7 @@ class Driver(Base):
         user: Пользователь.
     """
     __tablename__ = "drivers"
+    __table_args__ = (Index("ix_drivers_user_id_id", "user_id", "id"),)
     id = Column(Integer, primary_key=True)
     name = Column(String, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -32,6 +33,7 @@ class Location(Base):
         user: Пользователь.
     """
     __tablename__ = "locations"
+    __table_args__ = (Index("ix_locations_user_id_id", "user_id", "id"),)
     id = Column(Integer, primary_key=True)
     name = Column(String, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -42,6 +44,7 @@ class TimeMatrix(Base):
     Таблица времени в дороге между двумя пунктами,
     задаёт длительность любых маршрутов, а также время, которое водитель тратит
     между маршрутами, чтобы принять следующий маршрут.
+    Пара локаций хранится упорядоченной (from < to) и уникальна для пользователя.
 
     Атрибуты:
         id (int): Уникальный идентификатор матричного элемента.
@@ -54,6 +57,11 @@ class TimeMatrix(Base):
         user: Пользователь.
     """
     __tablename__ = "time_matrix"
+    __table_args__ = (
+        Index("ux_time_matrix_user_pair", "user_id", "from_location_id", "to_location_id",
+              unique=True),
+        Index("ix_time_matrix_user_id_id", "user_id", "id"),
+    )
     id = Column(Integer, primary_key=True)
     from_location_id = Column(Integer, ForeignKey("locations.id"))
     to_location_id = Column(Integer, ForeignKey("locations.id"))
@@ -79,6 +87,7 @@ class Route(Base):
         user: Пользователь.
     """
     __tablename__ = "routes"
+    __table_args__ = (Index("ix_routes_user_id_id", "user_id", "id"),)
     id = Column(Integer, primary_key=True)
     start_location_id = Column(Integer, ForeignKey("locations.id"))
     end_location_id = Column(Integer, ForeignKey("locations.id"))
@@ -105,6 +114,7 @@ class Schedule(Base):
         user: Пользователь.
     """
     __tablename__ = "schedules"
+    __table_args__ = (Index("ix_schedules_user_id_id", "user_id", "id"),)
     id = Column(Integer, primary_key=True)
     driver_name = Column(String)
     route_id = Column(Integer, ForeignKey("routes.id"))
@@ -1,7 +1,17 @@
 """
 Модуль содержит Pydantic-модели для обработки данных в БД
 """
-from pydantic import BaseModel
+import os
+from typing import Literal
+from pydantic import BaseModel, Field
+
+# Формат времени HH:MM маршрутов и фильтров списков: фильтры сравнивают
+# время как строки, что корректно только при двух цифрах часов и минут
+TIME_PATTERN = r"^([01]\d|2[0-3]):[0-5]\d$"
+
+# Ограничение времени генерации через API по умолчанию и его максимум, секунды
+SCHEDULE_TIME_BUDGET = float(os.getenv("SCHEDULE_TIME_BUDGET", "60"))
+SCHEDULE_TIME_BUDGET_MAX = float(os.getenv("SCHEDULE_TIME_BUDGET_MAX", "300"))
 
 #Водитель
 class DriverBase(BaseModel):
@@ -35,7 +45,7 @@ class TimeMatrixBase(BaseModel):
     travel_time: float
 
 class TimeMatrixCreate(TimeMatrixBase):
-    pass
+    travel_time: float = Field(ge=0)
 
 class TimeMatrixResponse(TimeMatrixBase):
     id: int
@@ -50,13 +60,32 @@ class RouteBase(BaseModel):
     time: str
 
 class RouteCreate(RouteBase):
-    pass
+    time: str = Field(pattern=TIME_PATTERN)
 
 class RouteResponse(RouteBase):
     id: int
     class Config:
         from_attributes = True
 
+#Постраничная выдача
+class PageParams(BaseModel):
+    limit: int | None = Field(None, ge=1, le=10000)
+    after_id: int | None = None
+    format: Literal["json", "ndjson"] = "json"
+
+#Массовая загрузка
+class BulkImportResponse(BaseModel):
+    created: int
+    updated: int = 0
+    ids: list[int] = []
+
+class TimeMatrixImportResponse(BaseModel):
+    rows: int
+    created: int
+    updated: int
+    rejected: int
+    errors: list[str]
+
 #Расписание
 class ScheduleBase(BaseModel):
     driver_name: str
@@ -76,6 +105,36 @@ class ScheduleResponse(ScheduleBase):
         from_attributes = True
 
 
+class ScheduleParams(BaseModel):
+    engine: str = "numpy"
+    population_size: int = Field(200, ge=4, le=5000)
+    generations: int = Field(1000, ge=0, le=100000)
+    mutation_prob: float = Field(0.1, ge=0, le=1)
+    time_budget: float = Field(SCHEDULE_TIME_BUDGET, gt=0, le=SCHEDULE_TIME_BUDGET_MAX)
+    stagnation_limit: int | None = Field(None, ge=1)
+    target_score: int | None = 0
+    presolve: bool = True
+    greedy_fraction: float = Field(0.1, ge=0, le=1)
+    local_search_elites: int = Field(0, ge=0)
+    polish: bool = True
+    warm_start: bool = False
+    seed: int | None = None
+    islands: int = Field(1, ge=1, le=64)
+    migration_interval: int = Field(50, ge=1, le=1000)
+    migrants: int = Field(2, ge=0)
+    workers: int | None = Field(None, ge=1, le=64)
+
+
+class ScheduleJobResponse(BaseModel):
+    id: str
+    status: str
+    progress: dict | None = None
+    result: dict | None = None
+    error: str | None = None
+    class Config:
+        from_attributes = True
+
+
 #Пользователь
 class UserCreate(BaseModel):
     username: str
@@ -0,0 +1,36 @@
+"""
+Движок "delta" против исходного "python" на одной задаче и одном seed:
+результаты совпадают, сравнивается только время.
+
+Запуск: python -m benchmarks.delta [маршрутов] [поколений]
+"""
+import sys
+import time
+
+from app.genetic.algorithm import GAConfig, solve
+from benchmarks.synthetic import make_instance
+
+
+def measure(instance, config):
+    started = time.perf_counter()
+    try:
+        _, stats = solve(instance, config)
+        score = stats["score"]
+    except ValueError:
+        score = None
+    return time.perf_counter() - started, score
+
+
+def main(routes=1000, generations=150):
+    instance = make_instance(drivers=routes // 5, routes=routes, seed=1)
+    times = {}
+    for engine in ("python", "delta"):
+        config = GAConfig(engine=engine, generations=generations, seed=1,
+                          target_score=None, presolve=False, polish=False)
+        times[engine], score = measure(instance, config)
+        print(f"{engine}: {times[engine]:.2f} с, оценка {score}")
+    print(f"Ускорение delta: x{times['python'] / times['delta']:.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
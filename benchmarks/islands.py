@@ -0,0 +1,36 @@
+"""
+Ускорение островной модели относительно одного острова.
+
+Запуск: python -m benchmarks.islands [число островов]
+"""
+import sys
+import time
+
+from app.genetic.algorithm import GAConfig, solve
+from benchmarks.synthetic import make_instance
+
+
+def measure(instance, config):
+    started = time.perf_counter()
+    try:
+        _, stats = solve(instance, config)
+        score = stats["score"]
+    except ValueError:
+        score = None
+    return time.perf_counter() - started, score
+
+
+def main(islands=4):
+    instance = make_instance(drivers=60, routes=300, seed=1)
+    base = GAConfig(engine="delta", generations=200, seed=1)
+    single, single_score = measure(instance, base)
+    # Та же суммарная работа: islands популяций по одной на процесс.
+    parallel, parallel_score = measure(instance, GAConfig(
+        engine="delta", generations=200, seed=1, islands=islands, workers=islands))
+    print(f"1 остров: {single:.2f} с, оценка {single_score}")
+    print(f"{islands} островов: {parallel:.2f} с, оценка {parallel_score}")
+    print(f"Пропускная способность: x{islands * single / parallel:.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
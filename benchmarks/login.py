@@ -0,0 +1,74 @@
+"""
+Волна входов в начале смены: пропускная способность /login и задержка
+обычных запросов (GET /drivers/) во время волны.
+
+Запуск: python -m benchmarks.login [число входов] [параллельных клиентов]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/login.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+
+def probe(client, headers, stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        client.get("/drivers/", headers=headers)
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.005)
+
+
+def main(logins=200, clients=50):
+    client = TestClient(app)
+    client.post("/register", json={"username": "bench", "password": "bench"})
+    token = client.post("/login", data={"username": "bench", "password": "bench"}).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+
+    def measure_probe(seconds):
+        latencies, stop = [], threading.Event()
+        thread = threading.Thread(target=probe, args=(client, headers, stop, latencies))
+        thread.start()
+        time.sleep(seconds)
+        stop.set()
+        thread.join()
+        return latencies
+
+    idle = measure_probe(1)
+
+    latencies, stop = [], threading.Event()
+    thread = threading.Thread(target=probe, args=(client, headers, stop, latencies))
+    thread.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        codes = list(pool.map(lambda _: client.post(
+            "/login", data={"username": "bench", "password": "bench"}).status_code,
+            range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    thread.join()
+
+    print(f"Входов: {codes.count(200)} за {elapsed:.2f} с "
+          f"({codes.count(200) / elapsed:.1f}/с), отклонено 503: {codes.count(503)}")
+    print(f"GET /drivers/ без нагрузки: p50 {percentile(idle, 0.5):.1f} мс, "
+          f"p99 {percentile(idle, 0.99):.1f} мс")
+    print(f"GET /drivers/ во время входов: p50 {percentile(latencies, 0.5):.1f} мс, "
+          f"p99 {percentile(latencies, 0.99):.1f} мс, "
+          f"среднее {statistics.mean(latencies) * 1000:.1f} мс")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
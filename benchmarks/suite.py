@@ -0,0 +1,228 @@
+"""
+Набор замеров для сравнения с базовой линией: генетический алгоритм и
+эндпоинты API на синтетических задачах нескольких масштабов с фиксированным seed.
+
+Для каждого замера записываются время работы, оценок в секунду (для алгоритма),
+пиковая память (tracemalloc) и итоговая оценка расписания. Результат
+сохраняется в JSON; с --compare замеры сравниваются с сохранённой базовой
+линией, и код возврата 1 означает регрессию.
+
+Запуск: python -m benchmarks.suite [--scales small,medium] [--out baseline.json]
+                                   [--compare baseline.json] [--threshold 0.2]
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/suite.db")
+
+from app.genetic.algorithm import GAConfig, run_genetic_algorithm, solve  # noqa: E402
+from app.genetic.instance import ProblemInstance  # noqa: E402
+from benchmarks.synthetic import make_problem  # noqa: E402
+
+# Масштабы задач: водители, локации, маршруты, доля заданных пар матрицы
+SCALES = {
+    "small": dict(drivers=20, locations=10, routes=60, density=1.0),
+    "medium": dict(drivers=60, locations=50, routes=300, density=1.0),
+    "large": dict(drivers=200, locations=200, routes=1000, density=0.3),
+}
+ENGINES = ("python", "numpy", "delta")
+GENERATIONS = 100
+# Пиковая память замеряется отдельным коротким запуском: tracemalloc
+# замедляет выделение памяти и исказил бы время основного замера.
+MEMORY_GENERATIONS = 10
+API_REPEATS = 5
+SEED = 1
+
+# Какие метрики сравниваются с базовой линией и в какую сторону хуже
+LOWER_IS_BETTER = ("wall_time", "peak_memory_kb")
+HIGHER_IS_BETTER = ("evaluations_per_sec", "score")
+
+
+def peak_memory(function, *args, **kwargs):
+    """Пиковый объём памяти (КБ), выделенной Python при вызове function."""
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return round(tracemalloc.get_traced_memory()[1] / 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def attempt(instance, config, **params):
+    """Статистика solve(); если расписание не найдено - оценка None."""
+    try:
+        return solve(instance, config, **params)[1]
+    except ValueError:
+        return {"score": None, "evaluations": 0}
+
+
+def bench_genetic(scale, problem):
+    instance = ProblemInstance(*problem)
+    records = []
+    for engine in ENGINES:
+        config = GAConfig(engine=engine, generations=GENERATIONS, seed=SEED,
+                          target_score=None, presolve=False, polish=False)
+        started = time.perf_counter()
+        stats = attempt(instance, config)
+        wall_time = time.perf_counter() - started
+        records.append({
+            "name": f"genetic/{engine}", "scale": scale,
+            "wall_time": round(wall_time, 4),
+            "evaluations_per_sec": round(stats["evaluations"] / wall_time, 1),
+            "peak_memory_kb": peak_memory(
+                attempt, instance, config, generations=MEMORY_GENERATIONS),
+            "score": stats["score"],
+        })
+
+    # Исходная точка входа со значениями по умолчанию (1000 поколений);
+    # движок "python" на таком числе поколений считал бы минуты, поэтому "numpy".
+    started = time.perf_counter()
+    try:
+        result = run_genetic_algorithm(*problem, engine="numpy")
+    except ValueError:
+        result = None
+    records.append({
+        "name": "run_genetic_algorithm/numpy", "scale": scale,
+        "wall_time": round(time.perf_counter() - started, 4),
+        "drivers": len(result) if result is not None else None,
+    })
+    return records
+
+
+def timed(call, repeats=API_REPEATS):
+    """Медиана времени (с), пиковая память (КБ) и последний ответ call()."""
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        response = call()
+        times.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+    return round(statistics.median(times), 4), peak_memory(call), response
+
+
+def bench_api(scale, problem):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    drivers_db, locations_db, time_matrix_db, routes_db = problem
+    client = TestClient(app)
+    username = f"bench-{scale}-{time.time_ns()}"
+    client.post("/register", json={"username": username, "password": "bench"})
+    token = client.post("/login", data={"username": username, "password": "bench"}).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    records = []
+
+    def record(name, call, repeats=API_REPEATS, **extra):
+        wall_time, memory, response = timed(call, repeats)
+        records.append({"name": f"api/{name}", "scale": scale, "wall_time": wall_time,
+                        "peak_memory_kb": memory, **extra})
+        return response
+
+    # Загрузка выполняется один раз: повторы создали бы дубликаты.
+    started = time.perf_counter()
+    location_ids = client.post("/locations/bulk", headers=headers, json=[
+        {"name": location.name} for location in locations_db]).json()["ids"]
+    client.post("/drivers/bulk", headers=headers, json=[
+        {"name": driver.name} for driver in drivers_db])
+    by_id = dict(zip((location.id for location in locations_db), location_ids))
+    client.post("/time-matrix/bulk", headers=headers, json=[
+        {"from_location_id": by_id[row.from_location_id],
+         "to_location_id": by_id[row.to_location_id],
+         "travel_time": row.travel_time} for row in time_matrix_db])
+    client.post("/routes/bulk", headers=headers, json=[
+        {"start_location_id": by_id[route.start_location_id],
+         "end_location_id": by_id[route.end_location_id],
+         "time": route.time} for route in routes_db])
+    records.append({"name": "api/bulk-load", "scale": scale,
+                    "wall_time": round(time.perf_counter() - started, 4)})
+
+    for path in ("/drivers/", "/locations/", "/time-matrix/", "/routes/"):
+        record(f"GET {path}", lambda: client.get(path, headers=headers))
+        record(f"GET {path} ndjson",
+               lambda: client.get(path, headers=headers, params={"format": "ndjson"}))
+
+    params = {"engine": "delta", "generations": GENERATIONS, "polish": False}
+    # Новый seed при каждом вызове - промах кэша результатов, один и тот же - попадание.
+    seeds = itertools.count(SEED)
+    response = record("GET /generate-schedule", lambda: client.get(
+        "/generate-schedule", headers=headers, params={**params, "seed": next(seeds)}))
+    records[-1]["score"] = response.json()["stats"]["score"]
+    record("GET /generate-schedule cached", lambda: client.get(
+        "/generate-schedule", headers=headers, params={**params, "seed": SEED}))
+    record("GET /get-schedule", lambda: client.get("/get-schedule", headers=headers))
+    return records
+
+
+def run(scales):
+    records = []
+    for scale in scales:
+        problem = make_problem(seed=SEED, **SCALES[scale])
+        for record in bench_genetic(scale, problem) + bench_api(scale, problem):
+            print(json.dumps(record, ensure_ascii=False))
+            records.append(record)
+    return {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count(), "generations": GENERATIONS, "seed": SEED},
+        "results": records,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Строки отчёта о регрессиях: метрика хуже базовой больше чем на threshold."""
+    previous = {(r["name"], r["scale"]): r for r in baseline["results"]}
+    regressions = []
+    for record in current["results"]:
+        old = previous.get((record["name"], record["scale"]))
+        if old is None:
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            new_value, old_value = record.get(metric), old.get(metric)
+            if new_value is None or old_value is None:
+                continue
+            if metric == "score":
+                # Оценка не больше 0, сравнивается без допуска.
+                worse = new_value < old_value
+            elif metric in LOWER_IS_BETTER:
+                worse = new_value > old_value * (1 + threshold)
+            else:
+                worse = new_value < old_value * (1 - threshold)
+            if worse:
+                regressions.append(f"{record['scale']} {record['name']} {metric}: "
+                                   f"{old_value} -> {new_value}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности RouteCreator")
+    parser.add_argument("--scales", default="small,medium",
+                        help=f"масштабы через запятую из {', '.join(SCALES)}")
+    parser.add_argument("--out", help="куда сохранить результаты (JSON)")
+    parser.add_argument("--compare", help="базовая линия (JSON) для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="допустимое ухудшение времени и памяти (доля)")
+    args = parser.parse_args(argv)
+
+    current = run(args.scales.split(","))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            json.dump(current, file, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            regressions = compare(current, json.load(file), args.threshold)
+        for line in regressions:
+            print(f"Регрессия: {line}")
+        print(f"Регрессий: {len(regressions)}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""
+Синтетические задачи для замеров: водители, локации, матрица времени и маршруты
+в тех же полях, что и модели БД, с фиксированным seed. Маршруты распределены
+по дню с 5:00 до 20:00; матрица времени полная или разреженная (density).
+"""
+import random
+from types import SimpleNamespace
+
+from app.genetic.instance import ProblemInstance
+
+
+def make_problem(drivers=30, locations=20, routes=300, seed=0, density=1.0):
+    """
+    density - доля пар локаций, для которых задано время в пути;
+    для остальных алгоритм берёт DEFAULT_TRAVEL_TIME.
+    """
+    rng = random.Random(seed)
+    locations_db = [SimpleNamespace(id=i, name=f"Локация {i}") for i in range(1, locations + 1)]
+    drivers_db = [SimpleNamespace(id=i, name=f"Водитель {i}") for i in range(1, drivers + 1)]
+    time_matrix_db = [SimpleNamespace(from_location_id=a, to_location_id=b,
+                                      travel_time=rng.randint(5, 60))
+                      for a in range(1, locations + 1) for b in range(a + 1, locations + 1)
+                      if density >= 1 or rng.random() < density]
+    routes_db = []
+    for route_id in range(1, routes + 1):
+        a, b = rng.sample(range(1, locations + 1), 2)
+        minutes = rng.randint(5 * 60, 20 * 60)
+        routes_db.append(SimpleNamespace(id=route_id, start_location_id=a, end_location_id=b,
+                                         start_location=locations_db[a - 1],
+                                         end_location=locations_db[b - 1],
+                                         time=f"{minutes // 60:02d}:{minutes % 60:02d}"))
+    return drivers_db, locations_db, time_matrix_db, routes_db
+
+
+def make_instance(drivers=30, locations=20, routes=300, seed=0, density=1.0):
+    return ProblemInstance(*make_problem(drivers, locations, routes, seed, density))
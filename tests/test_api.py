@@ -3,15 +3,37 @@
 """
 
 
+import asyncio
+import inspect
+import json
 import os
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
 
 os.environ["ENV"] = "test"
 
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
+from fastapi.routing import APIRoute
 from fastapi.testclient import TestClient
 from app.main import app
 from app.db.database import get_db
-from app.db.database import Base, engine
+from app.db.database import Base, engine, async_engine, async_url, SQLITE_BUSY_TIMEOUT
+from app.crud import crud, jobs, passwords
+from app.crud import metrics as metrics_router
+from app.crud.auth import token_cache
+from app.crud.result_cache import ResultCache
+from app.db.migrations import upgrade
+from app.crud import schedule
+from app.crud.schedule import load_instance, save_schedule
+from app import metrics
+from app.models.models import Route, Schedule, User
+from app.schemas.schemas import TimeMatrixCreate
 
 
 
@@ -82,6 +104,15 @@ def test_register_and_login():
     assert code == 200
     assert "access_token" in token_data
 
+def test_login_overload(monkeypatch):
+    monkeypatch.setattr(passwords, "_slots", threading.BoundedSemaphore(1))
+    passwords._slots.acquire()
+    _, code = login_user("testuser", "testpass")
+    assert code == 503
+    passwords._slots.release()
+    _, code = login_user("testuser", "testpass")
+    assert code == 200
+
 def test_post_operations():
     token_data, _ = login_user("testuser", "testpass")
     token = token_data["access_token"]
@@ -160,6 +191,340 @@ def test_generate_schedule():
     result = response.json()
     assert "schedule" in result
 
+    response = client.get("/generate-schedule", params={"generations": 5, "target_score": -1000},
+                          headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["stats"]["stop_reason"] == "target_score"
+
+    response = client.get("/generate-schedule", params={"warm_start": True},
+                          headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["stats"]["changed_routes"] == 0
+
+def test_schedule_params_limits():
+    token_data, _ = login_user("testuser", "testpass")
+    headers = {"Authorization": f"Bearer {token_data['access_token']}"}
+    for params in ({"islands": 10000}, {"workers": 10000}, {"population_size": 10**7},
+                   {"generations": 10**9}, {"time_budget": 10**6},
+                   {"migration_interval": 10**6}):
+        response = client.get("/generate-schedule", params=params, headers=headers)
+        assert response.status_code == 422
+        response = client.post("/schedule-jobs", params=params, headers=headers)
+        assert response.status_code == 422
+
+def test_result_cache(tmp_path):
+    token_data, _ = login_user("testuser", "testpass")
+    headers = {"Authorization": f"Bearer {token_data['access_token']}"}
+    params = {"seed": 7, "generations": 10}
+
+    response = client.get("/generate-schedule", params=params, headers=headers)
+    assert response.json()["cached"] is False
+    response = client.get("/generate-schedule", params=params, headers=headers)
+    assert response.json()["cached"] is True
+
+    # Любое изменение данных пользователя сбрасывает его результаты.
+    locations = client.get("/locations/", headers=headers).json()
+    client.put("/time-matrix/update", json={"from_location_id": locations[0]["id"],
+                                            "to_location_id": locations[1]["id"],
+                                            "travel_time": 20}, headers=headers)
+    response = client.get("/generate-schedule", params=params, headers=headers)
+    assert response.json()["cached"] is False
+
+    cache = ResultCache(path=str(tmp_path / "results.db"))
+    cache.put("key", 1, {"schedule": []})
+    assert ResultCache(path=str(tmp_path / "results.db")).get("key") == {"schedule": []}
+    cache.invalidate(1)
+    assert ResultCache(path=str(tmp_path / "results.db")).get("key") is None
+    cache = ResultCache(ttl=0)
+    cache.put("key", 1, {"schedule": []})
+    assert cache.get("key") is None
+
+def test_metrics_and_profile(tmp_path, monkeypatch):
+    token_data, _ = login_user("testuser", "testpass")
+    headers = {"Authorization": f"Bearer {token_data['access_token']}"}
+
+    monkeypatch.setattr(metrics, "PROFILE_DIR", str(tmp_path))
+    response = client.get("/generate-schedule", params={"seed": 11, "generations": 5},
+                          headers={**headers, "X-Profile": "1"})
+    assert "X-Profile-Dump" not in response.headers
+
+    monkeypatch.setattr(metrics, "PROFILE_USERS", {"testuser"})
+    monkeypatch.setattr(metrics, "PROFILE_KEEP", 2)
+    for _ in range(3):
+        response = client.get("/generate-schedule", params={"seed": 11, "generations": 5},
+                              headers={**headers, "X-Profile": "1"})
+        assert response.status_code == 200
+        dump = response.headers["X-Profile-Dump"]
+        assert os.path.basename(dump) == dump
+        assert (tmp_path / dump).exists()
+    assert len(list(tmp_path.glob("*.prof"))) == 2
+    response = client.get("/generate-schedule", params={"seed": 11, "generations": 5},
+                          headers=headers)
+    assert "X-Profile-Dump" not in response.headers
+
+    monkeypatch.setattr(metrics_router, "METRICS_TOKEN", "scrape")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=headers).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+    assert response.status_code == 200
+    text = response.text
+    assert 'schedule_stage_seconds_count{stage="solve"}' in text
+    assert 'ga_stage_seconds_bucket{engine="numpy",stage="evolve",le="+Inf"}' in text
+    assert 'result_cache_requests_total{result="hit"}' in text
+    assert ('http_requests_total{method="GET",path="/generate-schedule",status="200"}'
+            in text)
+
+
+def test_load_instance_queries():
+    db = TestingSessionLocal()
+    try:
+        user = db.query(User).filter(User.username == "testuser").first()
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            instance = load_instance(db, user.id)
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+    finally:
+        db.close()
+    assert len(statements) == 4
+    assert instance.genes[0]["start"] == "Локация A"
+
+def test_save_schedule_batched():
+    db = TestingSessionLocal()
+    try:
+        user = db.query(User).filter(User.username == "testuser").first()
+        route_id = db.query(Route.id).filter(Route.user_id == user.id).scalar()
+        previous = db.query(Schedule).filter(Schedule.user_id == user.id).count()
+        result = [{"driver": f"Водитель {k}",
+                   "routes": [{"route.id": route_id, "time": "09:00", "end_time": "09:20"}] * 500}
+                  for k in range(10)]
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            save_schedule(db, user.id, result)
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+        assert db.query(Schedule).filter(Schedule.user_id == user.id).count() == 5000
+        assert len(statements) == 2
+        save_schedule(db, user.id, result[:1])
+        assert db.query(Schedule).filter(Schedule.user_id == user.id).count() == 500
+        assert previous > 0
+    finally:
+        db.close()
+
+def test_bulk_import():
+    register_user("bulkuser", "bulkpass")
+    token_data, _ = login_user("bulkuser", "bulkpass")
+    headers = {"Authorization": f"Bearer {token_data['access_token']}"}
+
+    response = client.post("/locations/bulk", json=[{"name": "A"}, {"name": "B"}, {"name": "C"}],
+                           headers=headers)
+    assert response.status_code == 200
+    a, b, c = response.json()["ids"]
+    response = client.post("/drivers/bulk/csv", files={"file": ("drivers.csv", "name\nИван\nПётр\n")},
+                           headers=headers)
+    assert response.json()["created"] == 2
+
+    response = client.post("/time-matrix/bulk", headers=headers, json=[
+        {"from_location_id": b, "to_location_id": a, "travel_time": 10},
+        {"from_location_id": a, "to_location_id": c, "travel_time": 15}])
+    assert response.json() == {"created": 2, "updated": 0, "ids": []}
+    csv_text = f"from_location_id,to_location_id,travel_time\n{a},{b},12\n{b},{c},7\n"
+    response = client.post("/time-matrix/bulk/csv", files={"file": ("matrix.csv", csv_text)},
+                           headers=headers)
+    assert response.json() == {"created": 1, "updated": 1, "ids": []}
+    matrix = client.get("/time-matrix/", headers=headers).json()
+    assert sorted(m["travel_time"] for m in matrix) == [7, 12, 15]
+    response = client.post("/time-matrix/bulk", headers=headers, json=[
+        {"from_location_id": a, "to_location_id": b, "travel_time": -1}])
+    assert response.status_code == 422
+
+    response = client.post("/routes/bulk/csv", headers=headers, files={"file": (
+        "routes.csv", f"start_location_id,end_location_id,time\n{a},{b},09:00\n{b},{c},10:30\n")})
+    assert response.json()["created"] == 2
+
+    response = client.post("/routes/bulk", headers=headers,
+                           json=[{"start_location_id": a, "end_location_id": 10**6, "time": "09:00"}])
+    assert response.status_code == 400
+    response = client.post("/routes/bulk/csv", headers=headers, files={"file": (
+        "routes.csv", "start_location_id,end_location_id,time\nx,1,09:00\n")})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Строка 2")
+    # Время без ведущего нуля сломало бы строковые фильтры time_from/time_to.
+    for value in ("9:00", "24:00"):
+        route = {"start_location_id": a, "end_location_id": b, "time": value}
+        assert client.post("/routes/", headers=headers, json=route).status_code == 422
+        assert client.post("/routes/bulk", headers=headers, json=[route]).status_code == 422
+    assert len(client.get("/routes/", headers=headers).json()) == 2
+
+    csv_text = (f"from_location_id,to_location_id,travel_time\n{b},{a},11\n{c},{c},5\n"
+                f"{a},999999,5\n{a},x,5\n{c},{b},8\n{a},{c},-3\n")
+    response = client.post("/time-matrix/import", files={"file": ("matrix.csv", csv_text)},
+                           headers=headers)
+    report = response.json()
+    assert (report["rows"], report["created"], report["updated"], report["rejected"]) == (6, 0, 2, 4)
+    assert report["errors"][0].startswith("Строка 3")
+    assert report["errors"][-1].startswith("Строка 7: travel_time")
+
+    ndjson = "\n".join([json.dumps({"from_location_id": a, "to_location_id": b, "travel_time": 9}),
+                        "{broken", ""])
+    response = client.post("/time-matrix/import", files={"file": ("matrix.ndjson", ndjson)},
+                           headers=headers)
+    assert response.json()["updated"] == 1
+    assert response.json()["rejected"] == 1
+    matrix = client.get("/time-matrix/", headers=headers).json()
+    assert sorted(m["travel_time"] for m in matrix) == [8, 9, 15]
+
+def test_pagination():
+    token_data, _ = login_user("bulkuser", "bulkpass")
+    headers = {"Authorization": f"Bearer {token_data['access_token']}"}
+
+    response = client.get("/locations/", params={"limit": 2}, headers=headers)
+    first = response.json()
+    assert len(first) == 2
+    after_id = response.headers["X-Next-After-Id"]
+    assert after_id == str(first[-1]["id"])
+    response = client.get("/locations/", params={"limit": 2, "after_id": after_id}, headers=headers)
+    assert [l["name"] for l in response.json()] == ["C"]
+    assert "X-Next-After-Id" not in response.headers
+
+    c = response.json()[0]["id"]
+    response = client.get("/time-matrix/", params={"location_id": c, "format": "ndjson"},
+                          headers=headers)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 2
+    assert all(c in (row["from_location_id"], row["to_location_id"]) for row in rows)
+
+    for path in ("/routes/", "/get-schedule"):
+        for value in ("9:00", "24:00", "10:00'"):
+            response = client.get(path, params={"time_from": value}, headers=headers)
+            assert response.status_code == 422
+    response = client.get("/routes/", params={"time_from": "10:00"}, headers=headers)
+    assert [r["time"] for r in response.json()] == ["10:30"]
+    response = client.get("/drivers/", params={"name": "Ив"}, headers=headers)
+    assert [d["name"] for d in response.json()] == ["Иван"]
+
+def test_query_plans_use_indexes():
+    from sqlalchemy import select
+    from app.models.models import Driver, TimeMatrix
+
+    statements = [
+        (select(TimeMatrix.id).where(TimeMatrix.user_id == 1, TimeMatrix.from_location_id == 1,
+                                     TimeMatrix.to_location_id == 2),
+         "ux_time_matrix_user_pair"),
+        (select(Driver).where(Driver.user_id == 1, Driver.id > 5).order_by(Driver.id).limit(10),
+         "ix_drivers_user_id_id"),
+        (select(Schedule).where(Schedule.user_id == 1).order_by(Schedule.id),
+         "ix_schedules_user_id_id"),
+    ]
+    with engine.connect() as connection:
+        for statement, index in statements:
+            compiled = statement.compile(engine, compile_kwargs={"literal_binds": True})
+            plan = [row[3] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+            # SEARCH ... USING INDEX - поиск по индексу, SCAN - полный просмотр таблицы.
+            assert len(plan) == 1
+            assert plan[0].startswith("SEARCH") and index in plan[0]
+
+def test_migration_upgrade(tmp_path, caplog):
+    old_engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(bind=old_engine)
+    with old_engine.begin() as connection:
+        connection.execute(text("DROP INDEX ux_time_matrix_user_pair"))
+        connection.execute(text("DROP INDEX ix_routes_user_id_id"))
+        connection.execute(text("INSERT INTO time_matrix (from_location_id, to_location_id, "
+                                "travel_time, user_id) VALUES (1, 2, 10, 1), (1, 2, 15, 1)"))
+        connection.execute(text("INSERT INTO routes (start_location_id, end_location_id, time, "
+                                "user_id) VALUES (1, 2, '9:00', 1), (2, 1, '11:00', 1)"))
+    # При обычном запуске данные не удаляются, уникальный индекс откладывается.
+    assert upgrade(old_engine) == ["ix_routes_user_id_id"]
+    with old_engine.connect() as connection:
+        assert len(connection.execute(text("SELECT id FROM time_matrix")).all()) == 2
+        times = connection.execute(text("SELECT time FROM routes ORDER BY id")).scalars().all()
+        assert times == ["09:00", "11:00"]
+    assert "--remove-duplicate-pairs" in caplog.text
+
+    assert upgrade(old_engine, remove_duplicates=True) == ["ux_time_matrix_user_pair"]
+    assert "удалено дубликатов 1 в 1 парах" in caplog.text
+    assert upgrade(old_engine) == []
+    with old_engine.connect() as connection:
+        assert connection.execute(text("SELECT travel_time FROM time_matrix")).all() == [(15,)]
+    old_engine.dispose()
+
+def test_time_matrix_insert_race():
+    # Между проверкой и вставкой ту же пару записал параллельный запрос.
+    class RacingSession:
+        async def scalars(self, statement):
+            return SimpleNamespace(first=lambda: None)
+
+        def add(self, row):
+            pass
+
+        async def commit(self):
+            raise IntegrityError("INSERT INTO time_matrix", {}, Exception("UNIQUE"))
+
+        async def rollback(self):
+            self.rolled_back = True
+
+    db = RacingSession()
+    matrix = TimeMatrixCreate(from_location_id=1, to_location_id=2, travel_time=5)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(crud.create_time_matrix(matrix, db, SimpleNamespace(id=1)))
+    assert error.value.status_code == 400
+    assert error.value.detail == "Запись уже существует"
+    assert db.rolled_back
+
+def test_token_cache():
+    token_data, _ = login_user("testuser", "testpass")
+    headers = {"Authorization": f"Bearer {token_data['access_token']}"}
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    client.get("/drivers/", headers=headers)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+    try:
+        assert client.get("/drivers/", headers=headers).status_code == 200
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+    assert any("FROM drivers" in statement for statement in statements)
+    assert not any("FROM users" in statement for statement in statements)
+
+    token_cache.invalidate("testuser")
+    assert token_cache.get(token_data["access_token"]) is None
+    assert client.get("/drivers/", headers={"Authorization": "Bearer broken"}).status_code == 401
+
+def test_async_handlers_use_async_session():
+    # Синхронная сессия в async-обработчике блокирует цикл событий на время запроса к БД.
+    def calls(dependant):
+        for dependency in dependant.dependencies:
+            yield dependency.call
+            yield from calls(dependency)
+
+    async_routes = [route for route in app.routes if isinstance(route, APIRoute)
+                    and inspect.iscoroutinefunction(route.endpoint)]
+    assert {"/login", "/register"} <= {route.path for route in async_routes}
+    for route in async_routes:
+        assert get_db not in set(calls(route.dependant)), route.path
+
+
+def test_database_settings():
+    assert async_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+    assert async_url("postgresql://user@host/db") == "postgresql+asyncpg://user@host/db"
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == SQLITE_BUSY_TIMEOUT
+
 def test_get_schedule():
     token_data, _ = login_user("testuser", "testpass")
     token = token_data["access_token"]
@@ -168,3 +533,86 @@ def test_get_schedule():
     assert response.status_code == 200
     schedule = response.json()
     assert isinstance(schedule, list)
+
+    driver_name = schedule[0]["driver_name"]
+    response = client.get("/get-schedule", params={"driver_name": driver_name, "time_to": "23:59"},
+                          headers={"Authorization": f"Bearer {token}"})
+    assert all(entry["driver_name"] == driver_name for entry in response.json())
+
+def test_schedule_job():
+    token_data, _ = login_user("testuser", "testpass")
+    headers = {"Authorization": f"Bearer {token_data['access_token']}"}
+
+    response = client.post("/schedule-jobs", params={"seed": 1}, headers=headers)
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    for _ in range(600):
+        response = client.get(f"/schedule-jobs/{job_id}", headers=headers)
+        assert response.status_code == 200
+        job = response.json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.1)
+    assert job["status"] == "done"
+    assert job["progress"]["generation"] == job["result"]["stats"]["generations"]
+    assert "schedule" in job["result"]
+
+    response = client.get("/schedule-jobs/unknown", headers=headers)
+    assert response.status_code == 404
+
+    class BrokenSession:
+        def __getattr__(self, name):
+            raise RuntimeError("/srv/secret.db: disk I/O error")
+
+        def close(self):
+            pass
+
+    job = jobs.ScheduleJob(0, {"generations": 1})
+    jobs.run_job(job, session_factory=BrokenSession)
+    assert job.status == "failed" and job.error == schedule.GENERATION_FAILED
+
+def test_schedule_jobs_eviction(monkeypatch):
+    token_data, _ = login_user("testuser", "testpass")
+    headers = {"Authorization": f"Bearer {token_data['access_token']}"}
+    submitted = []
+    monkeypatch.setattr(jobs, "SCHEDULE_JOBS_KEPT", 2)
+    monkeypatch.setattr(jobs, "jobs", OrderedDict())
+    monkeypatch.setattr(jobs.executor, "submit", lambda *args: submitted.append(args))
+    for status in ("running", "done"):
+        job = jobs.ScheduleJob(0, {"generations": 1})
+        job.status = status
+        jobs.jobs[job.id] = job
+    running, done = list(jobs.jobs)
+
+    # Вытесняется завершённая задача, выполняющаяся остаётся.
+    response = client.post("/schedule-jobs", params={"generations": 1}, headers=headers)
+    assert response.status_code == 202
+    assert list(jobs.jobs) == [running, response.json()["id"]]
+    response = client.post("/schedule-jobs", params={"generations": 1}, headers=headers)
+    assert response.status_code == 503
+    assert len(submitted) == 1
+
+def test_stream_schedule(monkeypatch):
+    token_data, _ = login_user("testuser", "testpass")
+    headers = {"Authorization": f"Bearer {token_data['access_token']}"}
+
+    with client.stream("GET", "/generate-schedule/stream", params={"every": 1, "seed": 1},
+                       headers=headers) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        lines = [line for line in response.iter_lines() if line]
+    events = [line.split(": ", 1)[1] for line in lines if line.startswith("event: ")]
+    data = [json.loads(line.split(": ", 1)[1]) for line in lines if line.startswith("data: ")]
+    assert events == ["progress", "result"]
+    assert "schedule" in data[0]
+    assert data[-1]["stats"]["stop_reason"] == "target_score"
+
+    def broken_save(*args):
+        raise RuntimeError("/srv/secret.db: disk I/O error")
+
+    monkeypatch.setattr(schedule, "save_schedule", broken_save)
+    with client.stream("GET", "/generate-schedule/stream", params={"every": 1, "seed": 1},
+                       headers=headers) as response:
+        lines = [line for line in response.iter_lines() if line]
+    assert lines[-2:] == ["event: error", 'data: {"detail": "%s"}' % schedule.GENERATION_FAILED]
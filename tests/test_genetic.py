@@ -0,0 +1,254 @@
+"""
+Тесты генетического алгоритма без обращения к API и БД
+"""
+import random
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.genetic.algorithm import (GAConfig, run_genetic_algorithm, create_engine,
+                                   create_individual, crossover, grade, mutate, solve)
+from app.genetic import islands
+from app.genetic.delta import DeltaContext, TrackedIndividual, create_tracked
+from app.genetic.instance import ProblemInstance
+from app.genetic.local_search import LocalSearch
+from app.genetic.presolve import check_feasibility, min_drivers, peak_overlap
+from app.genetic.seeding import greedy_individual, warm_individual
+from app.genetic.vectorized import grade_population
+from benchmarks.synthetic import make_instance
+
+
+def make_problem():
+    locations = [SimpleNamespace(id=1, name="A"), SimpleNamespace(id=2, name="B")]
+    drivers = [SimpleNamespace(id=10, name="Водитель 1"), SimpleNamespace(id=20, name="Водитель 2")]
+    time_matrix = [SimpleNamespace(from_location_id=1, to_location_id=2, travel_time=20)]
+    routes = []
+    for route_id, (start, end, time) in enumerate([(1, 2, "09:00"), (2, 1, "09:30"),
+                                                   (1, 2, "09:10"), (2, 1, "09:40")], start=1):
+        routes.append(SimpleNamespace(id=route_id, start_location_id=start, end_location_id=end,
+                                      start_location=locations[start - 1],
+                                      end_location=locations[end - 1], time=time))
+    return drivers, locations, time_matrix, routes
+
+
+def test_problem_instance():
+    instance = ProblemInstance(*make_problem())
+    assert instance.route_ids == [1, 3, 2, 4]
+    assert instance.start.tolist() == [540, 550, 570, 580]
+    assert instance.end.tolist() == [560, 570, 590, 600]
+    # Имеет значение только порядок "раньше -> позже", т.е. верхний треугольник.
+    assert np.triu(instance.conflicts, 1).tolist() == [[False, True, False, False],
+                                           [False, False, True, False],
+                                           [False, False, False, True],
+                                           [False, False, False, False]]
+
+
+def test_grade_population():
+    # Маршруты по времени: 09:00 A-B, 09:10 A-B, 09:30 B-A, 09:40 B-A; 20 минут + 10 запаса.
+    conflicts = np.array([[False, True, False, False],
+                          [False, False, True, False],
+                          [False, False, False, True],
+                          [False, False, False, False]])
+    population = np.array([[0, 1, 0, 1],   # без конфликтов, нагрузка ровная
+                           [0, 0, 1, 1],   # два конфликта
+                           [0, 0, 0, 0]])  # один водитель: штраф за нагрузку и конфликты
+    scores = grade_population(population, conflicts, 2)
+    assert scores.tolist() == [0, -200, -4 - 300]
+
+
+def test_numpy_engine_schedule():
+    result = run_genetic_algorithm(*make_problem(), engine="numpy")
+    routes = {d["driver"]: [r["route.id"] for r in d["routes"]] for d in result}
+    assert sorted(sum(routes.values(), [])) == [1, 2, 3, 4]
+    assert sorted(routes.values()) == [[1, 2], [3, 4]]
+
+
+def test_grade_matches_vectorized():
+    instance = ProblemInstance(*make_problem())
+    for _ in range(50):
+        individual = create_individual(instance)
+        row = np.array([individual])
+        assert grade(individual, instance) == grade_population(row, instance.conflicts, 2)[0]
+
+
+def test_fitness_cache_keeps_result():
+    instance = ProblemInstance(*make_problem())
+    cached, stats = solve(instance, generations=50, seed=7)
+    uncached, uncached_stats = solve(instance, generations=50, seed=7, fitness_cache_size=0)
+    assert cached == uncached
+    assert uncached_stats["cache_hits"] == 0
+    assert stats["evaluations"] <= uncached_stats["evaluations"] * 0.8
+
+
+def test_tracked_individual_matches_grade():
+    instance = ProblemInstance(*make_problem())
+    context = DeltaContext(instance)
+    individual = create_tracked(context)
+    for _ in range(50):
+        individual = individual.derive()
+        individual.set_driver(random.randrange(instance.n_routes), random.randrange(2))
+        assert individual.score == grade(individual.drivers, instance)
+
+
+def test_delta_engine_matches_python():
+    instance = ProblemInstance(*make_problem())
+    expected, _ = solve(instance, engine="python", generations=50, seed=11)
+    result, stats = solve(instance, engine="delta", generations=50, seed=11)
+    assert result == expected
+    assert stats["engine"] == "delta"
+
+    # Крупная задача: потомки и пересобираются заново, и пересчитываются по изменённым генам.
+    instance = make_instance(drivers=60, routes=300, seed=1)
+    engines = [create_engine(instance, GAConfig(engine=engine, population_size=100, seed=3))
+               for engine in ("python", "delta")]
+    for engine in engines:
+        engine.populate()
+        for _ in range(40):
+            engine.step()
+    assert engines[0].scores() == engines[1].scores()
+
+
+def test_islands_reproducible():
+    instance = ProblemInstance(*make_problem())
+    params = dict(engine="numpy", generations=30, islands=3, migration_interval=10, seed=5)
+    pool = islands.get_pool()
+    first, stats = solve(instance, workers=1, **params)
+    second, _ = solve(instance, workers=3, **params)
+    assert first == second
+    assert stats["islands"] == 3
+    # Пул процессов общий для всех запусков, а не создаётся на каждый.
+    assert islands.get_pool() is pool
+
+
+def test_islands_time_budget():
+    # Эпоха длиннее всего запуска: остров должен сам остановиться по deadline.
+    instance = ProblemInstance(*make_problem())
+    started = time.monotonic()
+    _, stats = solve(instance, engine="python", islands=2, migration_interval=100000,
+                     generations=100000, time_budget=1, target_score=None, presolve=False)
+    assert time.monotonic() - started < 5
+    assert stats["stop_reason"] == "time_budget"
+    assert stats["generations"] < 100000
+
+
+def test_early_stop_reasons():
+    instance = ProblemInstance(*make_problem())
+    _, stats = solve(instance, seed=3, target_score=0)
+    assert stats["stop_reason"] == "target_score"
+    assert stats["generations"] < 1000
+    _, stats = solve(instance, seed=3, stagnation_limit=5)
+    assert stats["stop_reason"] == "stagnation"
+    _, stats = solve(instance, seed=3, generations=20)
+    assert stats["stop_reason"] == "generations"
+    assert stats["generations"] == 20
+
+
+def test_presolve_min_drivers():
+    drivers, locations, time_matrix, routes = make_problem()
+    instance = ProblemInstance(drivers, locations, time_matrix, routes)
+    assert peak_overlap(instance) == 2
+    assert min_drivers(instance) == 2
+    assert check_feasibility(instance) == 2
+
+    instance = ProblemInstance(drivers[:1], locations, time_matrix, routes)
+    with pytest.raises(ValueError, match="не хватает 1"):
+        solve(instance)
+
+
+def test_presolve_stays_cheap():
+    # 5000 маршрутов: граф цепочек не строится, хватает нижней границы.
+    instance = make_instance(drivers=1000, locations=50, routes=5000, seed=1)
+    tracemalloc.start()
+    started = time.perf_counter()
+    needed = check_feasibility(instance)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert needed == peak_overlap(instance)
+    assert elapsed < 2
+    assert peak < 20 * 2**20
+
+
+def test_greedy_seeding():
+    instance = ProblemInstance(*make_problem())
+    individual = greedy_individual(instance, random.Random(1))
+    assert grade(individual, instance) == 0
+
+    _, stats = solve(instance, seed=1, greedy_fraction=0.1, target_score=0)
+    assert stats["generations"] == 1
+
+
+def test_local_search():
+    instance = ProblemInstance(*make_problem())
+    context = DeltaContext(instance)
+    rng = random.Random(4)
+    for _ in range(20):
+        individual = create_tracked(context, rng)
+        i, j = rng.randrange(4), rng.randrange(4)
+        driver = rng.randrange(2)
+        gain = individual.relocate_gain(i, driver)
+        before = individual.score
+        moved = TrackedIndividual(context, individual.drivers)
+        moved.set_driver(i, driver)
+        assert moved.score - before == gain
+        gain = individual.swap_gain(i, j)
+        assert individual.score == before
+        a, b = individual.drivers[i], individual.drivers[j]
+        swapped = individual.drivers[:]
+        swapped[i], swapped[j] = b, a
+        assert TrackedIndividual(context, swapped).score - before == gain
+
+    drivers, score = LocalSearch(instance).improve([0, 0, 0, 0])
+    assert score == 0
+    assert TrackedIndividual(context, drivers).score == 0
+    # После deadline раунды не начинаются.
+    search = LocalSearch(instance, deadline=time.monotonic())
+    drivers, score = search.improve([0, 0, 0, 0])
+    assert list(drivers) == [0, 0, 0, 0] and score < 0
+    assert search.evaluated == 0
+
+    _, stats = solve(instance, engine="numpy", seed=2, generations=5,
+                     local_search_elites=2, polish=True)
+    assert stats["score"] == 0
+    assert "local_search_applied" in stats
+    assert stats["polish_gain"] == 0 and "polish" not in stats["timings"]
+
+    rows = instance.conflict_rows()
+    assert [list(row) for row in rows] == instance.conflicts.astype(int).tolist()
+
+
+def test_warm_start():
+    drivers, locations, time_matrix, routes = make_problem()
+    instance = ProblemInstance(drivers, locations, time_matrix, routes)
+    # Маршрут 4 новый: вставляется к водителю, у которого не создаёт конфликтов.
+    previous = {1: 10, 2: 10, 3: 20}
+    individual = warm_individual(instance, previous)
+    assert [instance.driver_ids[d] for d in individual[:3]] == [10, 20, 10]
+    assert TrackedIndividual(DeltaContext(instance), individual).score == 0
+
+    _, stats = solve(instance, seed=1, warm_start=previous, target_score=0)
+    assert stats["generations"] == 1
+    assert stats["changed_routes"] == 0
+
+def test_stage_timings():
+    instance = ProblemInstance(*make_problem())
+    _, stats = solve(instance, engine="python", generations=3, seed=1, polish=True)
+    assert {"populate", "grade", "breed", "decode"} <= set(stats["timings"])
+    assert "grade_seconds" not in stats
+    _, stats = solve(instance, engine="numpy", generations=3, seed=1)
+    assert "evolve" in stats["timings"]
+
+
+def test_chromosome_operators():
+    instance = ProblemInstance(*make_problem())
+    rng = random.Random(5)
+    parent1, parent2 = create_individual(instance, rng), create_individual(instance, rng)
+    assert parent1.typecode == "H" and len(parent1) == instance.n_routes
+    child = crossover(parent1, parent2, rng)
+    assert all(c in (a, b) for a, b, c in zip(parent1, parent2, child))
+    before = sorted(child)
+    mutated = mutate(child, mutation_prob=1, rng=rng)
+    assert mutated is child and sorted(mutated) == before